@@ -0,0 +1,123 @@
+"""
+Benchmark ZipNum index lookups for different index block sizes
+
+Writes a synthetic index with fixed line count blocks and with byte size
+targeted blocks, then looks up random urls the way a replay client does:
+binary search of index.idx, a range read of one block of index.cdx.gz,
+then decompressing and scanning the block
+
+    python benchmarks/bench_block_size.py --lines 200000 --lookups 2000
+"""
+
+from argparse import ArgumentParser
+from bisect import bisect_right
+import io, json, os, random, statistics, tempfile, time, zlib
+
+from wacz.indexwriter import ParallelCompressedWriter
+
+CONFIGS = [
+    ("1024 lines", 1024, None),
+    ("8K", 4096, 8 * 1024),
+    ("32K", 4096, 32 * 1024),
+    ("64K", 4096, 64 * 1024),
+    ("128K", 4096, 128 * 1024),
+]
+
+
+def make_lines(num_lines, seed=1):
+    """Sorted index lines, some with long cookies, as in crawls with sessions"""
+    rand = random.Random(seed)
+    lines = []
+    for i in range(num_lines):
+        key = "com,example)/{0}/{1:08d}".format(rand.choice("abcdefgh"), i)
+        data = {"url": "https://example.com/" + key, "status": "200"}
+        if rand.random() < 0.2:
+            data["req.http:cookie"] = "%x" % rand.getrandbits(rand.randint(64, 8192))
+
+        lines.append("{0} 20200101000000 {1}\n".format(key, json.dumps(data)))
+
+    lines.sort()
+    return lines
+
+
+def write_index(lines, path, num_lines, block_size):
+    index_out = io.StringIO()
+    with open(path, "wb") as data_out:
+        writer = ParallelCompressedWriter(
+            index_out, data_out, num_lines, block_size=block_size
+        )
+        for line in lines:
+            writer.write(line)
+        writer.flush()
+
+    keys = []
+    blocks = []
+    for line in index_out.getvalue().splitlines()[1:]:
+        prefix, block = line.split(" {", 1)
+        block = json.loads("{" + block)
+        keys.append(prefix)
+        blocks.append((block["offset"], block["length"]))
+
+    return keys, blocks
+
+
+def lookup(fd, keys, blocks, key):
+    i = max(bisect_right(keys, key) - 1, 0)
+    offset, length = blocks[i]
+    data = os.pread(fd, length, offset)
+    text = zlib.decompress(data, 16 + zlib.MAX_WBITS).decode("utf-8")
+    for line in text.splitlines():
+        if line.startswith(key):
+            return line
+
+    return None
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark lookups per index block size")
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    rand = random.Random(2)
+    # urlkey and timestamp, as in the idx prefixes
+    lookup_keys = [rand.choice(lines).split(" {", 1)[0] for _ in range(args.lookups)]
+
+    print(
+        "{0:12} {1:>7} {2:>12} {3:>12} {4:>12} {5:>12}".format(
+            "blocks", "count", "mean size", "max size", "mean lookup", "p99 lookup"
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, num_lines, block_size in CONFIGS:
+            path = os.path.join(temp_dir, "index.cdx.gz")
+            keys, blocks = write_index(lines, path, num_lines, block_size)
+            sizes = [length for _, length in blocks]
+
+            fd = os.open(path, os.O_RDONLY)
+            timings = []
+            try:
+                for key in lookup_keys:
+                    start = time.perf_counter()
+                    assert lookup(fd, keys, blocks, key)
+                    timings.append(time.perf_counter() - start)
+            finally:
+                os.close(fd)
+
+            timings.sort()
+            print(
+                "{0:12} {1:7d} {2:11.1f}K {3:11.1f}K {4:10.3f}ms {5:10.3f}ms".format(
+                    name,
+                    len(blocks),
+                    statistics.mean(sizes) / 1024,
+                    max(sizes) / 1024,
+                    statistics.mean(timings) * 1000,
+                    timings[int(len(timings) * 0.99)] * 1000,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
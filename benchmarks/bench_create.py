@@ -0,0 +1,16 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from wacz.main import main
+
+
+@pytest.mark.parametrize(
+    "args", [[], ["-d"], ["-d", "-t"]], ids=["index", "detect-pages", "text"]
+)
+def test_create(benchmark, warc, tmp_path, rounds, args):
+    output = str(tmp_path / "bench.wacz")
+    result = benchmark.pedantic(
+        main, args=(["create", "-o", output] + args + [warc],), rounds=rounds
+    )
+    assert result == 0
@@ -0,0 +1,38 @@
+import io
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from wacz.waczindexer import WACZIndexer
+from wacz.indexwriter import DEFAULT_INDEX_FIELDS
+
+CONFIGS = {
+    "index": {},
+    "detect-pages": {"detect_pages": True},
+    "compressed": {"lines": 1024, "digest_records": True},
+}
+
+
+def index(warc, config):
+    """Index the WARC into memory, as write_index does without the WACZ"""
+    kwargs = dict(CONFIGS[config])
+    if "lines" in kwargs:
+        kwargs["compress"] = io.BytesIO()
+        kwargs["data_out_name"] = "index.cdx.gz"
+
+    indexer = WACZIndexer(
+        io.StringIO(),
+        [warc],
+        sort=True,
+        post_append=True,
+        fields=DEFAULT_INDEX_FIELDS,
+        **kwargs
+    )
+    indexer.process_all()
+    return indexer
+
+
+@pytest.mark.parametrize("config", list(CONFIGS))
+def test_indexer(benchmark, warc, rounds, config):
+    indexer = benchmark.pedantic(index, args=(warc, config), rounds=rounds)
+    assert sum(indexer.record_counts.values()) > 0
@@ -0,0 +1,49 @@
+import subprocess
+import sys
+import pytest
+
+resource = pytest.importorskip("resource")
+
+from warcgen import generate_warc
+
+# max growth of peak RSS from the small to the large corpus, the extracted
+# text alone of the extra pages is over 80M
+MAX_RSS_GROWTH = 40 * 1024 * 1024
+
+CREATE_SCRIPT = """
+import resource, sys
+from wacz.main import main
+result = main(["create", "-o", sys.argv[2]] + sys.argv[3:] + [sys.argv[1]])
+assert result == 0
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def peak_rss(warc, output, args):
+    """Run create in a new interpreter
+    :returns: peak resident set size in bytes
+    :rtype: int
+    """
+    stdout = subprocess.run(
+        [sys.executable, "-c", CREATE_SCRIPT, warc, output] + args,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    # kilobytes on linux, bytes on macos
+    scale = 1 if sys.platform == "darwin" else 1024
+    return int(stdout.strip().splitlines()[-1]) * scale
+
+
+def test_create_text_bounded_memory(tmp_path):
+    """Peak memory of create -d -t does not grow with the number of pages"""
+    rss = []
+    for num_records in (500, 2000):
+        warc = str(tmp_path / "corpus-{0}.warc.gz".format(num_records))
+        generate_warc(warc, num_records=num_records, html_ratio=0.8, payload_size=65536)
+
+        # a small sort budget, so that the index isn't held in memory either
+        output = str(tmp_path / "corpus-{0}.wacz".format(num_records))
+        rss.append(peak_rss(warc, output, ["-d", "-t", "--sort-memory", "1M"]))
+
+    assert rss[1] - rss[0] < MAX_RSS_GROWTH
@@ -0,0 +1,118 @@
+"""
+Benchmark pages writing with each JSON backend
+
+Stores pages with full text in the page store, then writes them out as a
+page list, as done with wacz create --detect-pages --text
+
+    python benchmarks/bench_pages_json.py --pages 20000 --text-size 8000
+"""
+
+from argparse import ArgumentParser
+import io, random, string, time
+from unittest.mock import patch
+
+from wacz import fastjson
+from wacz.pagestore import PageStore
+from wacz.waczindexer import WACZIndexer
+
+
+def make_pages(num_pages, text_size, seed=1):
+    rand = random.Random(seed)
+    words = [
+        "".join(rand.choice(string.ascii_lowercase) for _ in range(rand.randint(2, 10)))
+        for _ in range(2000)
+    ] + ["café", "naïve", "☃"]
+
+    pages = []
+    for i in range(num_pages):
+        text = []
+        size = 0
+        while size < text_size:
+            word = rand.choice(words)
+            text.append(word)
+            size += len(word) + 1
+
+        pages.append(
+            {
+                "timestamp": "2020100721{0:04d}".format(i % 10000),
+                "url": "https://example.com/page/{0}".format(i),
+                "title": "Page {0}".format(i),
+                "text": " ".join(text),
+            }
+        )
+
+    return pages
+
+
+def write_pages(pages):
+    """Store pages, then stream them to a page list, returning bytes written"""
+    store = PageStore()
+    for i, page in enumerate(pages):
+        store[str(i)] = page
+
+    out = io.BytesIO()
+    indexer = WACZIndexer(io.StringIO(), [])
+    for line in indexer.serialize_json_pages(
+        store.values(), id="pages", title="Pages", has_text=True
+    ):
+        out.write(line.encode("utf-8"))
+
+    store.close()
+    return out.tell()
+
+
+def encode_decode_pages(pages, dumps, loads):
+    """Round trip the pages through the backend only, returning bytes encoded"""
+    size = 0
+    for page in pages:
+        data = dumps(page)
+        loads(data)
+        size += len(data)
+
+    return size
+
+
+def report(name, label, num_pages, size, elapsed):
+    print(
+        "{0:8} {1:14} {2:10.0f} pages/s {3:8.1f} MB/s".format(
+            name, label, num_pages / elapsed, size / elapsed / 1024 / 1024
+        )
+    )
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return result, best
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark pages writing per JSON backend")
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--text-size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.text_size)
+
+    for name, (dumps, loads) in fastjson.BACKENDS.items():
+        size, elapsed = best_time(
+            lambda: encode_decode_pages(pages, dumps, loads), args.repeat
+        )
+        report(name, "encode+decode", args.pages, size, elapsed)
+
+        with patch.object(fastjson, "dumps", dumps), patch.object(
+            fastjson, "output_dumps", dumps
+        ), patch.object(fastjson, "loads", loads):
+            size, elapsed = best_time(lambda: write_pages(pages), args.repeat)
+
+        report(name, "pages writing", args.pages, size, elapsed)
+
+
+if __name__ == "__main__":
+    main()
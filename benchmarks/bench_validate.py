@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from wacz.main import main
+
+
+@pytest.fixture
+def wacz(warc, tmp_path):
+    output = str(tmp_path / "bench.wacz")
+    assert main(["create", "-o", output, "-d", warc]) == 0
+    return output
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_validate(benchmark, wacz, rounds, workers):
+    args = ["validate", "-f", wacz, "--workers", str(workers)]
+    result = benchmark.pedantic(main, args=(args,), rounds=rounds)
+    assert result == 0
@@ -0,0 +1,23 @@
+import os
+import pytest
+from warcgen import generate_warc
+
+# corpus size and rounds, eg. WACZ_BENCH_RECORDS=50000 pytest benchmarks
+BENCH_RECORDS = int(os.environ.get("WACZ_BENCH_RECORDS", 2000))
+BENCH_ROUNDS = int(os.environ.get("WACZ_BENCH_ROUNDS", 3))
+
+
+@pytest.fixture(scope="session", params=["gzip", "plain"])
+def warc(request, tmp_path_factory):
+    """Synthetic WARC, generated once per session for each compression"""
+    gzip = request.param == "gzip"
+    filename = tmp_path_factory.mktemp("corpus") / (
+        "bench.warc.gz" if gzip else "bench.warc"
+    )
+    generate_warc(str(filename), num_records=BENCH_RECORDS, gzip=gzip)
+    return str(filename)
+
+
+@pytest.fixture
+def rounds():
+    return BENCH_ROUNDS
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from warcio.archiveiterator import ArchiveIterator
+from warcgen import generate_warc
+
+
+class TestWarcGen(unittest.TestCase):
+    def read_records(self, filename):
+        with open(filename, "rb") as fh:
+            return [
+                (
+                    record.rec_type,
+                    record.rec_headers.get_header("WARC-Target-URI"),
+                    (
+                        record.http_headers.get_header("Content-Type")
+                        if record.http_headers
+                        else None
+                    ),
+                )
+                for record in ArchiveIterator(fh)
+            ]
+
+    def test_deterministic(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outputs = []
+            for name, seed in (("a", 1), ("b", 1), ("c", 2)):
+                filename = os.path.join(tmpdir, name + ".warc.gz")
+                generate_warc(filename, num_records=50, seed=seed)
+                with open(filename, "rb") as fh:
+                    outputs.append(fh.read())
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertNotEqual(outputs[0], outputs[2])
+
+    def test_records(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "corpus.warc")
+            counts = generate_warc(
+                filename,
+                num_records=200,
+                html_ratio=0.5,
+                revisit_ratio=0.5,
+                gzip=False,
+                url_length=100,
+            )
+            records = self.read_records(filename)
+
+        types = [record[0] for record in records]
+        self.assertEqual(counts, {type_: types.count(type_) for type_ in set(types)})
+        self.assertEqual(counts["request"], 200)
+        self.assertEqual(counts["response"] + counts["revisit"], 200)
+        self.assertTrue(counts["revisit"] > 0)
+
+        html = [record for record in records if record[2] == "text/html"]
+        self.assertTrue(60 < len(html) < 140)
+
+        for _, url, _ in records[1:]:
+            self.assertTrue(95 <= len(url) <= 105, url)
+
+    def test_no_revisits(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "corpus.warc.gz")
+            counts = generate_warc(filename, num_records=50, revisit_ratio=0)
+
+        self.assertEqual(counts["revisit"], 0)
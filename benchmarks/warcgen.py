@@ -0,0 +1,235 @@
+"""
+Deterministic synthetic WARC generator for benchmarks
+
+Writes a warcinfo record, then a request and a response or revisit record
+for each capture. Html pages link to each other and are the referrer of the
+resources loaded after them, so pages are found with --detect-pages. The
+same arguments always produce the same bytes.
+
+    python benchmarks/warcgen.py corpus.warc.gz --records 10000 --html-ratio 0.2
+"""
+
+from argparse import ArgumentParser
+from io import BytesIO
+import datetime, random, uuid
+
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+START_DATE = datetime.datetime(2021, 1, 1)
+
+RESOURCE_TYPES = [
+    ("application/javascript", "js"),
+    ("text/css", "css"),
+    ("image/png", "png"),
+    ("application/json", "json"),
+]
+
+
+def make_words(rand, num_words=2000):
+    return [
+        "".join(
+            rand.choice("abcdefghijklmnopqrstuvwxyz")
+            for _ in range(rand.randint(2, 10))
+        )
+        for _ in range(num_words)
+    ]
+
+
+def make_url(rand, kind, num, ext, url_length):
+    """Url padded with random path segments to about url_length chars"""
+    url = "https://example.com/{0}/{1:08d}".format(kind, num)
+    while len(url) + 1 < url_length:
+        segment = "".join(
+            rand.choice("abcdefghijklmnopqrstuvwxyz0123456789")
+            for _ in range(min(12, url_length - len(url) - 1))
+        )
+        url += "/" + segment
+
+    return url + "." + ext if ext else url + "/"
+
+
+def make_html(rand, words, title, links, size):
+    parts = ["<html><head><title>{0}</title></head><body>".format(title)]
+    length = len(parts[0])
+    while length < size:
+        para = "<p>{0}</p>".format(" ".join(rand.choice(words) for _ in range(40)))
+        parts.append(para)
+        length += len(para)
+
+    for link in links:
+        parts.append('<a href="{0}">{0}</a>'.format(link))
+
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def generate_warc(
+    filename,
+    num_records=1000,
+    html_ratio=0.2,
+    revisit_ratio=0.2,
+    gzip=True,
+    url_length=60,
+    payload_size=4096,
+    seed=1,
+):
+    """Write a synthetic WARC with num_records captures
+    :param html_ratio: fraction of captures which are html pages
+    :param revisit_ratio: fraction of non-html captures which are revisits of
+    an earlier capture
+    :param url_length: approximate length of each url
+    :param payload_size: approximate size of each payload
+    :returns: number of records of each type written
+    :rtype: dict
+    """
+    rand = random.Random(seed)
+    words = make_words(rand)
+    counts = {"warcinfo": 0, "request": 0, "response": 0, "revisit": 0}
+
+    def warc_headers(num):
+        date = START_DATE + datetime.timedelta(seconds=num)
+        return {
+            "WARC-Record-ID": "<urn:uuid:{0}>".format(
+                uuid.UUID(int=rand.getrandbits(128), version=4)
+            ),
+            "WARC-Date": date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+
+    with open(filename, "wb") as fh:
+        writer = WARCWriter(fh, gzip=gzip)
+
+        info = "software: py-wacz benchmarks\r\nformat: WARC File Format 1.0\r\n"
+        writer.write_record(
+            writer.create_warc_record(
+                "",
+                "warcinfo",
+                payload=BytesIO(info.encode("utf-8")),
+                warc_content_type="application/warc-fields",
+                warc_headers_dict=warc_headers(0),
+            )
+        )
+        counts["warcinfo"] += 1
+
+        page_url = None
+        captured = []
+
+        for num in range(num_records):
+            is_html = rand.random() < html_ratio
+
+            if is_html:
+                url = make_url(rand, "page", num, "", url_length)
+                mime = "text/html"
+                links = [
+                    make_url(rand, "page", rand.randrange(num_records), "", url_length)
+                    for _ in range(5)
+                ]
+                payload = make_html(
+                    rand, words, "Page {0}".format(num), links, payload_size
+                )
+            else:
+                mime, ext = rand.choice(RESOURCE_TYPES)
+                url = make_url(rand, "static", num, ext, url_length)
+                # compressible, as static resources often are
+                size = max(payload_size // 4, 1)
+                payload = rand.getrandbits(size * 8).to_bytes(size, "big") * 4
+
+            response_headers = StatusAndHeaders(
+                "200 OK",
+                [("Content-Type", mime), ("Content-Length", str(len(payload)))],
+                protocol="HTTP/1.1",
+            )
+
+            if not is_html and captured and rand.random() < revisit_ratio:
+                orig_url, orig_date, digest = rand.choice(captured)
+                response = writer.create_revisit_record(
+                    url,
+                    digest,
+                    orig_url,
+                    orig_date,
+                    http_headers=response_headers,
+                    warc_headers_dict=warc_headers(num),
+                )
+                counts["revisit"] += 1
+            else:
+                response = writer.create_warc_record(
+                    url,
+                    "response",
+                    payload=BytesIO(payload),
+                    length=len(payload),
+                    http_headers=response_headers,
+                    warc_headers_dict=warc_headers(num),
+                )
+                counts["response"] += 1
+                if not is_html:
+                    captured.append(
+                        (
+                            url,
+                            response.rec_headers.get_header("WARC-Date"),
+                            response.rec_headers.get_header("WARC-Payload-Digest"),
+                        )
+                    )
+
+            # the request follows its response, referred by the previous page
+            request_headers = [("Host", "example.com"), ("User-Agent", "py-wacz-bench")]
+            if page_url:
+                request_headers.append(("Referer", page_url))
+
+            request_warc_headers = warc_headers(num)
+            request_warc_headers["WARC-Concurrent-To"] = (
+                response.rec_headers.get_header("WARC-Record-ID")
+            )
+
+            path = url.split("example.com", 1)[1]
+            request = writer.create_warc_record(
+                url,
+                "request",
+                http_headers=StatusAndHeaders(
+                    "GET {0} HTTP/1.1".format(path),
+                    request_headers,
+                    is_http_request=True,
+                ),
+                warc_headers_dict=request_warc_headers,
+            )
+
+            writer.write_record(response)
+            writer.write_record(request)
+            counts["request"] += 1
+
+            if is_html:
+                page_url = url
+
+    return counts
+
+
+def main():
+    parser = ArgumentParser(description="Generate a synthetic WARC for benchmarks")
+    parser.add_argument("filename")
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--html-ratio", type=float, default=0.2)
+    parser.add_argument("--revisit-ratio", type=float, default=0.2)
+    parser.add_argument("--url-length", type=int, default=60)
+    parser.add_argument("--payload-size", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--no-gzip",
+        action="store_true",
+        help="Write an uncompressed WARC, otherwise each record is gzipped",
+    )
+    args = parser.parse_args()
+
+    counts = generate_warc(
+        args.filename,
+        num_records=args.records,
+        html_ratio=args.html_ratio,
+        revisit_ratio=args.revisit_ratio,
+        gzip=not args.no_gzip,
+        url_length=args.url_length,
+        payload_size=args.payload_size,
+        seed=args.seed,
+    )
+    print(", ".join("{0} {1}".format(count, type_) for type_, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
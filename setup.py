@@ -24,7 +24,10 @@ setup(
     long_description=long_description(),
     long_description_content_type="text/markdown",
     install_requires=load_requirements("requirements.txt"),
-    extras_require={"signing": ["authsign>=0.5.1", "requests"]},
+    extras_require={
+        "signing": ["authsign>=0.5.1", "requests"],
+        "fast-json": ["orjson>=3.6"],
+    },
     zip_safe=True,
     setup_requires=["pytest-runner"],
     entry_points="""
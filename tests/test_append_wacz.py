@@ -0,0 +1,116 @@
+import unittest
+import tempfile
+import os
+import shutil
+import zipfile, json
+from wacz.main import main
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+
+
+class TestAppendWacz(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.warc_1 = os.path.join(TEST_DIR, "example-collection.warc")
+        self.warc_2 = os.path.join(TEST_DIR, "example-iana.warc")
+
+        self.full_wacz = os.path.join(self.tmpdir.name, "full.wacz")
+        main(["create", "-o", self.full_wacz, "-d", self.warc_1, self.warc_2])
+
+        self.orig_wacz = os.path.join(self.tmpdir.name, "orig.wacz")
+        main(["create", "-o", self.orig_wacz, "-d", "--title", "Title", self.warc_1])
+
+        self.appended_wacz = os.path.join(self.tmpdir.name, "appended.wacz")
+        shutil.copyfile(self.orig_wacz, self.appended_wacz)
+        self.result = main(["append", self.appended_wacz, "-d", self.warc_2])
+
+    def test_append_valid(self):
+        self.assertEqual(self.result, 0)
+        self.assertEqual(main(["validate", "-f", self.appended_wacz]), 0)
+
+    def test_append_index_merged(self):
+        """The merged index should match an index created from all WARCs at once"""
+        with zipfile.ZipFile(self.full_wacz) as full_zf, zipfile.ZipFile(
+            self.appended_wacz
+        ) as appended_zf:
+            for filename in ("indexes/index.cdx.gz", "indexes/index.idx"):
+                self.assertEqual(full_zf.read(filename), appended_zf.read(filename))
+
+            self.assertEqual(sorted(full_zf.namelist()), sorted(appended_zf.namelist()))
+
+    def test_append_existing_data_unchanged(self):
+        """Data before the original central directory should not be modified"""
+        with zipfile.ZipFile(self.orig_wacz) as zf:
+            orig_start_dir = zf.start_dir
+
+        with open(self.orig_wacz, "rb") as fh:
+            orig_data = fh.read(orig_start_dir)
+
+        with open(self.appended_wacz, "rb") as fh:
+            self.assertEqual(fh.read(orig_start_dir), orig_data)
+
+    def test_append_pages_and_datapackage(self):
+        with zipfile.ZipFile(self.orig_wacz) as zf:
+            orig_pages = (
+                zf.read("pages/pages.jsonl").decode("utf-8").strip().split("\n")
+            )
+
+        with zipfile.ZipFile(self.appended_wacz) as zf:
+            pages = zf.read("pages/pages.jsonl").decode("utf-8").strip().split("\n")
+            datapackage = json.loads(zf.read("datapackage.json"))
+
+        # existing pages kept as is, new pages added after
+        self.assertEqual(pages[: len(orig_pages)], orig_pages)
+        urls = [json.loads(page)["url"] for page in pages[1:]]
+        self.assertIn("http://www.example.com/", urls)
+        self.assertIn("https://example.com/", urls)
+
+        self.assertEqual(datapackage["title"], "Title")
+        self.assertEqual(
+            sorted(resource["path"] for resource in datapackage["resources"]),
+            [
+                "archive/example-collection.warc",
+                "archive/example-iana.warc",
+                "indexes/index.cdx.gz",
+                "indexes/index.idx",
+                "pages/pages.jsonl",
+            ],
+        )
+
+    def test_append_existing_warc(self):
+        """Appending a WARC already in the WACZ should fail without changes"""
+        with open(self.appended_wacz, "rb") as fh:
+            data = fh.read()
+
+        self.assertEqual(main(["append", self.appended_wacz, self.warc_1]), 1)
+
+        with open(self.appended_wacz, "rb") as fh:
+            self.assertEqual(fh.read(), data)
+
+    def test_append_invalid_datapackage(self):
+        """Appending to a WACZ with resources missing their hash should fail cleanly"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            invalid_wacz = os.path.join(tmpdir, "invalid.wacz")
+            with zipfile.ZipFile(self.orig_wacz) as src, zipfile.ZipFile(
+                invalid_wacz, "w"
+            ) as dest:
+                for info in src.infolist():
+                    data = src.read(info)
+                    if info.filename == "datapackage.json":
+                        datapackage = json.loads(data)
+                        del datapackage["resources"][0]["hash"]
+                        data = json.dumps(datapackage).encode("utf-8")
+                    dest.writestr(info, data)
+
+            with open(invalid_wacz, "rb") as fh:
+                data = fh.read()
+
+            self.assertEqual(main(["append", invalid_wacz, self.warc_2]), 1)
+
+            with open(invalid_wacz, "rb") as fh:
+                self.assertEqual(fh.read(), data)
+
+
+if __name__ == "__main__":
+    unittest.main()
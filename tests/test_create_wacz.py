@@ -176,6 +176,30 @@ class TestWaczFormat(unittest.TestCase):
         valid = validate(self.wacz_json)
         self.assertTrue(valid.valid)
 
+    @patch("wacz.waczindexer.hash_stream")
+    def test_datapackage_hashes_computed_on_write(self, mock_hash_stream):
+        """All entries should be hashed as they are written, without re-reading the wacz"""
+        mock_hash_stream.side_effect = AssertionError("zip entry re-read for hashing")
+        output = os.path.join(self.tmpdir.name, "hashed_on_write.wacz")
+        self.assertEqual(
+            main(
+                [
+                    "create",
+                    "-f",
+                    os.path.join(TEST_DIR, "example-collection.warc"),
+                    "-o",
+                    output,
+                    "-l",
+                    os.path.join(TEST_DIR, "logs"),
+                    "--detect-pages",
+                ]
+            ),
+            0,
+        )
+        mock_hash_stream.assert_not_called()
+
+        self.assertEqual(main(["validate", "-f", output]), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
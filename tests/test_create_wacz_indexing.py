@@ -1,8 +1,9 @@
 import unittest
 import tempfile
 import os
-from wacz.main import main, now
-from wacz.util import check_http_and_https
+from wacz.main import main, now, load_passed_pages
+from wacz.util import check_http_and_https, construct_passed_pages_dict
+import copy, json, pickle, gzip, hashlib
 
 import zipfile
 
@@ -22,6 +23,64 @@ class TestWaczIndexing(unittest.TestCase):
         match = check_http_and_https(check_url, "", pages_dict)
         self.assertEqual(match, "")
 
+    def test_passed_pages_index_matches_plain_dict(self):
+        pages = [
+            {"url": "https://www.example.org/"},
+            {"url": "http://www.example.org/about#section"},
+            {"url": "http://www.example.org/about", "ts": "2020-10-07T21:22:36Z"},
+            {"url": "https://www.example.org/about", "ts": "2020-10-07T21:22:36Z"},
+            {"url": "https://www.example.org/contact", "ts": "2020-10-07T21:22:36Z"},
+            {"url": "ftp://www.example.org/"},
+            {"url": "no-scheme"},
+        ]
+        passed_pages_dict = construct_passed_pages_dict(
+            [json.dumps({"format": "json-pages-1.0"})]
+            + [json.dumps(page) for page in pages]
+        )
+        plain_dict = dict(passed_pages_dict)
+
+        urls = [
+            "http://www.example.org/",
+            "https://www.example.org/",
+            "https://www.example.org/about",
+            "http://www.example.org/contact",
+            "ftp://www.example.org/",
+            "no-scheme",
+            "https://fake/",
+        ]
+
+        def check_all(pages_dict):
+            return [
+                check_http_and_https(url, ts, pages_dict)
+                for url in urls
+                for ts in ("", "20201007212236", "20201007212237")
+            ]
+
+        self.assertEqual(check_all(passed_pages_dict), check_all(plain_dict))
+
+        # index is kept up to date as pages are matched, and when copied
+        for key in [
+            "http://www.example.org/about",
+            "20201007212236/http://www.example.org/about",
+        ]:
+            del passed_pages_dict[key]
+            del plain_dict[key]
+
+        self.assertEqual(check_all(passed_pages_dict), check_all(plain_dict))
+        self.assertEqual(
+            check_all(pickle.loads(pickle.dumps(passed_pages_dict))),
+            check_all(plain_dict),
+        )
+        self.assertEqual(
+            check_all(copy.deepcopy(passed_pages_dict)), check_all(plain_dict)
+        )
+
+        for key in list(plain_dict):
+            passed_pages_dict.pop(key)
+
+        self.assertEqual(passed_pages_dict, {})
+        self.assertEqual(passed_pages_dict.index, {})
+
     def test_warc_with_other_metadata(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             self.assertEqual(
@@ -148,6 +207,48 @@ class TestWaczIndexing(unittest.TestCase):
                     ],
                 )
 
+    def test_load_passed_pages_header(self):
+        passed_pages_dict = load_passed_pages(
+            os.path.join(TEST_DIR, "pages", "pages.jsonl")
+        )
+        self.assertEqual(passed_pages_dict.header["title"], "All Pages")
+        self.assertNotIn("format", str(list(passed_pages_dict.values())))
+        self.assertTrue(len(passed_pages_dict) > 0)
+
+    def test_warc_with_extra_pages_invalid_lines(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "test-extra-pages.jsonl"), "wt") as fh:
+                fh.write(
+                    """\
+{"url": "https://www.iana.org/about"}
+
+not json
+{"url": "https://www.iana.org/protocols"}
+
+"""
+                )
+
+            self.assertEqual(
+                main(
+                    [
+                        "create",
+                        "-f",
+                        os.path.join(TEST_DIR, "example-iana.warc"),
+                        "-o",
+                        os.path.join(tmpdir, "test-extra-pages.wacz"),
+                        "-e",
+                        os.path.join(tmpdir, "test-extra-pages.jsonl"),
+                    ]
+                ),
+                0,
+            )
+
+            with zipfile.ZipFile(os.path.join(tmpdir, "test-extra-pages.wacz")) as zf:
+                self.assertEqual(
+                    zf.read("pages/extraPages.jsonl"),
+                    b'{"url": "https://www.iana.org/about"}\n{"url": "https://www.iana.org/protocols"}',
+                )
+
     def test_warc_with_detect_pages_split_seeds(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             self.assertEqual(
@@ -316,3 +417,82 @@ class TestWaczIndexing(unittest.TestCase):
                         "pages/pages.jsonl",
                     ],
                 )
+
+    def read_index_lines(self, filename):
+        with zipfile.ZipFile(filename) as zf:
+            data = gzip.decompress(zf.read("indexes/index.cdx.gz")).decode("utf-8")
+
+        return [json.loads(line.split(" ", 2)[2]) for line in data.splitlines()]
+
+    def read_page_urls(self, filename):
+        with zipfile.ZipFile(filename) as zf:
+            lines = zf.read("pages/pages.jsonl").decode("utf-8").splitlines()
+
+        return sorted(json.loads(line)["url"] for line in lines[1:])
+
+    def test_index_fields(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outputs = {}
+            for name, args in (
+                ("default", []),
+                ("none", ["--index-fields", ""]),
+                ("truncate", ["--max-field-size", "10"]),
+                ("hash", ["--max-field-size", "10", "--oversize-fields", "hash"]),
+            ):
+                outputs[name] = os.path.join(tmpdir, name + ".wacz")
+                self.assertEqual(
+                    main(
+                        [
+                            "create",
+                            "-f",
+                            os.path.join(TEST_DIR, "example-iana.warc"),
+                            "-o",
+                            outputs[name],
+                            "--detect-pages",
+                        ]
+                        + args
+                    ),
+                    0,
+                )
+
+            default = self.read_index_lines(outputs["default"])
+            referrers = [line["referrer"] for line in default if "referrer" in line]
+            self.assertTrue(referrers)
+
+            # referrer is still used to detect pages, but not written
+            self.assertFalse(
+                any(
+                    "referrer" in line
+                    for line in self.read_index_lines(outputs["none"])
+                )
+            )
+            self.assertEqual(
+                self.read_page_urls(outputs["none"]),
+                self.read_page_urls(outputs["default"]),
+            )
+
+            truncated = [
+                line["referrer"]
+                for line in self.read_index_lines(outputs["truncate"])
+                if "referrer" in line
+            ]
+            self.assertEqual(truncated, [referrer[:10] for referrer in referrers])
+
+            hashed = [
+                line["referrer"]
+                for line in self.read_index_lines(outputs["hash"])
+                if "referrer" in line
+            ]
+            self.assertEqual(
+                hashed,
+                [
+                    "sha256:" + hashlib.sha256(referrer.encode("utf-8")).hexdigest()
+                    for referrer in referrers
+                ],
+            )
+
+            # other fields are unchanged
+            self.assertEqual(
+                [line["url"] for line in self.read_index_lines(outputs["hash"])],
+                [line["url"] for line in default],
+            )
@@ -0,0 +1,97 @@
+import unittest
+import tempfile
+import os
+import zipfile, json
+from wacz.main import main
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+PAGES_DIR = os.path.join(TEST_DIR, "pages")
+
+INPUTS = [
+    os.path.join(TEST_DIR, "example-collection.warc"),
+    os.path.join(TEST_DIR, "example-iana.warc"),
+    os.path.join(TEST_DIR, "example-resource.warc.gz"),
+]
+
+
+class TestWaczSplit(unittest.TestCase):
+    def test_split_at_warc_boundaries(self):
+        max_size = max(os.path.getsize(filename) for filename in INPUTS)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "archive.wacz")
+            self.assertEqual(
+                main(
+                    ["create", "-o", output, "--max-size", str(max_size), "-d"] + INPUTS
+                ),
+                0,
+            )
+
+            self.assertFalse(os.path.exists(output))
+
+            with open(os.path.join(tmpdir, "archive.json")) as fh:
+                manifest = json.load(fh)
+
+            self.assertEqual(manifest["profile"], "multi-wacz-package")
+            self.assertTrue(len(manifest["resources"]) > 1)
+
+            warcs = []
+            for num, resource in enumerate(manifest["resources"], 1):
+                self.assertEqual(resource["path"], "archive-{0}.wacz".format(num))
+                part = os.path.join(tmpdir, resource["path"])
+                self.assertEqual(resource["bytes"], os.path.getsize(part))
+                self.assertEqual(main(["validate", "-f", part]), 0)
+
+                with zipfile.ZipFile(part) as zf:
+                    names = zf.namelist()
+                    self.assertIn("indexes/index.cdx.gz", names)
+                    self.assertIn("datapackage.json", names)
+                    part_warcs = [name for name in names if name.startswith("archive/")]
+                    size = sum(zf.getinfo(name).file_size for name in part_warcs)
+                    self.assertTrue(len(part_warcs) == 1 or size <= max_size)
+                    warcs.extend(part_warcs)
+
+            self.assertEqual(
+                warcs, ["archive/" + os.path.basename(name) for name in INPUTS]
+            )
+
+    def test_split_passed_pages(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "archive.wacz")
+            self.assertEqual(
+                main(
+                    [
+                        "create",
+                        "-o",
+                        output,
+                        "--max-size",
+                        "1",
+                        "-p",
+                        os.path.join(PAGES_DIR, "pages.jsonl"),
+                    ]
+                    + INPUTS
+                ),
+                0,
+            )
+
+            with open(os.path.join(tmpdir, "archive.json")) as fh:
+                manifest = json.load(fh)
+
+            self.assertEqual(len(manifest["resources"]), len(INPUTS))
+
+            for resource in manifest["resources"]:
+                part = os.path.join(tmpdir, resource["path"])
+                self.assertEqual(main(["validate", "-f", part]), 0)
+
+    def test_no_split_when_under_max_size(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "archive.wacz")
+            self.assertEqual(
+                main(["create", "-o", output, "--max-size", "1G"] + INPUTS), 0
+            )
+            self.assertTrue(os.path.exists(output))
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, "archive.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+import tempfile
+import os
+import zipfile, json
+from warcio.archiveiterator import ArchiveIterator
+from wacz.main import main
+from wacz.waczindexer import index_run
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+PAGES_DIR = os.path.join(TEST_DIR, "pages")
+
+# example-warcinfo-metadata.warc shares payloads with the other inputs
+INPUTS = [
+    os.path.join(TEST_DIR, "example-warcinfo-metadata.warc"),
+    os.path.join(TEST_DIR, "example-collection.warc"),
+    os.path.join(TEST_DIR, "example-iana.warc"),
+    os.path.join(TEST_DIR, "example-resource.warc.gz"),
+]
+
+
+def read_pages(zf, filename):
+    pages = []
+    for line in zf.read(filename).decode("utf-8").strip().split("\n"):
+        page = json.loads(line)
+        # page ids are randomly generated if not passed in
+        page.pop("id", None)
+        pages.append(page)
+
+    return pages
+
+
+def split_warcinfo(filename, tmpdir):
+    """Split a WARC into its warcinfo records and its other records
+    :returns: paths of the two WARCs
+    :rtype: list
+    """
+    with open(filename, "rb") as fh:
+        data = fh.read()
+        fh.seek(0)
+        it = ArchiveIterator(fh)
+        records = [
+            (record.rec_type, it.get_record_offset(), it.get_record_length())
+            for record in it
+        ]
+
+    outputs = []
+    for name, is_warcinfo in (("warcinfo.warc", True), ("records.warc", False)):
+        outputs.append(os.path.join(tmpdir, name))
+        with open(outputs[-1], "wb") as out:
+            for rec_type, offset, length in records:
+                if (rec_type == "warcinfo") == is_warcinfo:
+                    out.write(data[offset : offset + length])
+
+    return outputs
+
+
+class TestWaczWorkers(unittest.TestCase):
+    def create_and_compare(self, args, parallel_args=["--workers", "3"], inputs=INPUTS):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            serial = os.path.join(tmpdir, "serial.wacz")
+            parallel = os.path.join(tmpdir, "parallel.wacz")
+
+            self.assertEqual(main(["create", "-o", serial] + args + inputs), 0)
+            self.assertEqual(
+                main(["create", "-o", parallel] + parallel_args + args + inputs), 0
+            )
+
+            with zipfile.ZipFile(serial) as serial_zf, zipfile.ZipFile(
+                parallel
+            ) as parallel_zf:
+                self.assertEqual(
+                    sorted(serial_zf.namelist()), sorted(parallel_zf.namelist())
+                )
+
+                for filename in ("indexes/index.cdx.gz", "indexes/index.idx"):
+                    self.assertEqual(
+                        serial_zf.read(filename), parallel_zf.read(filename)
+                    )
+
+                for filename in serial_zf.namelist():
+                    if filename.startswith("pages/"):
+                        self.assertEqual(
+                            read_pages(serial_zf, filename),
+                            read_pages(parallel_zf, filename),
+                        )
+
+            self.assertEqual(main(["validate", "-f", parallel]), 0)
+
+    def test_workers_detect_pages_and_text(self):
+        self.create_and_compare(["--detect-pages", "--text"])
+
+    def test_text_workers(self):
+        self.create_and_compare(
+            ["--detect-pages", "--text"], parallel_args=["--text-workers", "2"]
+        )
+
+    def test_workers_main_url_split_seeds(self):
+        self.create_and_compare(
+            [
+                "--detect-pages",
+                "--split-seeds",
+                "--url",
+                "https://example.com/",
+            ]
+        )
+
+    def test_workers_passed_pages(self):
+        self.create_and_compare(["-p", os.path.join(PAGES_DIR, "pages.jsonl")])
+
+    def test_workers_no_pages(self):
+        self.create_and_compare([])
+
+    def test_workers_warcinfo_pages_in_other_input(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            inputs = split_warcinfo(
+                os.path.join(TEST_DIR, "example-collection-with-lists.warc"), tmpdir
+            )
+            self.create_and_compare(["--text"], inputs=inputs)
+
+    def test_workers_text_shared_payload(self):
+        """Inputs with the same payload, in a revisit and an error page, get
+        the same text as when indexed in a single process
+        """
+        args = ["-d", "-t", "--split-seeds", "--url", "https://www.iana.org/about"]
+        self.create_and_compare(args)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "archive.wacz")
+            self.assertEqual(main(["create", "-o", output] + args + INPUTS), 0)
+            with zipfile.ZipFile(output) as zf:
+                pages = read_pages(zf, "pages/extraPages.jsonl")
+
+        # a revisit of a 404, with the same payload as an html page
+        favicon = [page for page in pages if page.get("url", "").endswith(".ico")]
+        self.assertEqual(len(favicon), 1)
+        self.assertNotIn("text", favicon[0])
+        self.assertEqual(favicon[0]["title"], favicon[0]["url"])
+
+    def test_worker_text_only_for_pages(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # as passed by create
+            kwargs = {"post_append": True, "digest_records": True, "extract_text": True}
+            result = index_run(INPUTS[2], os.path.join(tmpdir, "run.cdxj"), kwargs)
+            # no page list in the warcinfo, text is left to the replay
+            self.assertEqual(result["text_stats"].get("pages", 0), 0)
+            html_events = [
+                event
+                for event in result["page_events"]
+                if event[0] == "record" and event[3]
+            ]
+            self.assertTrue(html_events)
+            self.assertTrue(all(event[5] is not None for event in html_events))
+
+            result = index_run(
+                INPUTS[2],
+                os.path.join(tmpdir, "run.cdxj"),
+                dict(kwargs, detect_pages=True),
+            )
+            self.assertTrue(result["text_stats"]["pages"] > 0)
+            html_events = [
+                event
+                for event in result["page_events"]
+                if event[0] == "record" and event[3]
+            ]
+            self.assertTrue(all(event[5] is None for event in html_events))
+
+
+if __name__ == "__main__":
+    unittest.main()
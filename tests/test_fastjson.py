@@ -0,0 +1,144 @@
+import unittest
+import json
+import os
+import sys
+import subprocess
+import tempfile
+import zipfile
+from unittest.mock import patch
+from wacz.main import main
+from wacz import fastjson
+from wacz.pagestore import PageStore
+from wacz.util import construct_passed_pages_dict, validateJSON
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+
+VALUES = [
+    {"url": "https://example.com/", "title": "Example", "ts": "20201007212236"},
+    {"text": 'multi\nline "quoted" text\twith\\escapes', "title": "été ☃"},
+    {"emoji": "\U0001f600", "nested": {"list": [1, 2.5, -3, True, False, None]}},
+    {"big": 2**70, "float": 1e-7, "empty": {}, "empty_list": []},
+    {1: "int key"},
+    [],
+    "string",
+    12345,
+]
+
+INVALID = ["", "{", '{"url": }', "not json", "{'single': 'quotes'}"]
+
+
+class TestFastJson(unittest.TestCase):
+    def test_backends_available(self):
+        self.assertIn("json", fastjson.BACKENDS)
+        self.assertIn(fastjson.BACKEND, fastjson.BACKENDS)
+
+    def test_dumps_equivalent(self):
+        for name, (dumps, loads) in fastjson.BACKENDS.items():
+            for value in VALUES:
+                with self.subTest(backend=name, value=value):
+                    self.assertEqual(
+                        json.loads(dumps(value)), json.loads(json.dumps(value))
+                    )
+
+    def test_loads_equivalent(self):
+        for name, (dumps, loads) in fastjson.BACKENDS.items():
+            for value in VALUES:
+                data = json.dumps(value)
+                with self.subTest(backend=name, value=value):
+                    self.assertEqual(loads(data), json.loads(data))
+                    self.assertEqual(loads(data.encode("utf-8")), json.loads(data))
+
+    def test_loads_invalid(self):
+        for name, (dumps, loads) in fastjson.BACKENDS.items():
+            for data in INVALID:
+                with self.subTest(backend=name, data=data):
+                    with self.assertRaises(fastjson.JSONDecodeError):
+                        loads(data)
+
+                    self.assertFalse(validateJSON(data))
+
+    def test_page_store_roundtrip(self):
+        pages = PageStore()
+        for i, value in enumerate(VALUES[:4]):
+            pages[str(i)] = value
+
+        self.assertEqual(list(pages.values()), VALUES[:4])
+        pages.close()
+
+    def test_passed_pages(self):
+        lines = [json.dumps({"format": "json-pages-1.0", "id": "pages"})]
+        lines += [json.dumps({"url": "https://example.com/☃", "title": "é"})]
+        lines += ["not json"]
+
+        passed_pages_dict = construct_passed_pages_dict(lines)
+        self.assertEqual(passed_pages_dict.header["id"], "pages")
+        self.assertEqual(
+            dict(passed_pages_dict),
+            {"https://example.com/☃": {"url": "https://example.com/☃", "title": "é"}},
+        )
+
+    def test_output_backend(self):
+        """Files in the WACZ are only written with orjson when set explicitly"""
+        for env, expected in (("", "json"), ("json", "json"), ("orjson", "orjson")):
+            if expected not in fastjson.BACKENDS:
+                continue
+
+            script = "from wacz import fastjson; print(fastjson.OUTPUT_BACKEND)"
+            output = subprocess.run(
+                [sys.executable, "-c", script],
+                env=dict(os.environ, WACZ_JSON_BACKEND=env),
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout
+            with self.subTest(env=env):
+                self.assertEqual(output.strip(), expected)
+
+    def create_with_backend(self, tmpdir, name):
+        """Create a wacz with pages and text, writing json with this backend"""
+        output = os.path.join(tmpdir, name + ".wacz")
+        with patch("wacz.fastjson.output_dumps", fastjson.BACKENDS[name][0]):
+            main(
+                [
+                    "create",
+                    "-o",
+                    output,
+                    "-d",
+                    "-t",
+                    "--title",
+                    "Titre été",
+                    os.path.join(TEST_DIR, "example-iana.warc"),
+                ]
+            )
+
+        with zipfile.ZipFile(output) as zf:
+            lines = zf.read("pages/pages.jsonl").decode("utf-8").splitlines()
+            datapackage = json.loads(zf.read("datapackage.json"))
+
+        pages = [json.loads(line) for line in lines]
+        for page in pages[1:]:
+            # random page ids
+            page.pop("id")
+
+        for resource in datapackage["resources"]:
+            if resource["path"] == "pages/pages.jsonl":
+                resource.pop("hash")
+                resource.pop("bytes")
+        datapackage.pop("created")
+        return pages, datapackage
+
+    def test_page_lists_and_datapackage_equivalent(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pages, datapackage = self.create_with_backend(tmpdir, "json")
+            self.assertTrue(len(pages) > 1)
+            self.assertTrue(pages[0]["hasText"])
+
+            for name in fastjson.BACKENDS:
+                with self.subTest(backend=name):
+                    self.assertEqual(
+                        self.create_with_backend(tmpdir, name), (pages, datapackage)
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import subprocess
+import sys
+import json
+
+# only imported by the subcommands that need them
+HEAVY_MODULES = [
+    "frictionless",
+    "boilerpy3",
+    "requests",
+    "pkg_resources",
+    "cdxj_indexer",
+    "warcio",
+    "wacz.waczindexer",
+    "wacz.validate",
+]
+
+
+def loaded_modules(code):
+    """Run code in a new interpreter
+    :returns: names of the modules loaded after running it
+    :rtype: set
+    """
+    script = code + "\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))"
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, check=True, text=True
+    ).stdout
+    return set(json.loads(output.strip().splitlines()[-1]))
+
+
+class TestImportTime(unittest.TestCase):
+    def assertNotLoaded(self, modules):
+        loaded = [
+            name
+            for name in HEAVY_MODULES
+            if any(
+                module == name or module.startswith(name + ".") for module in modules
+            )
+        ]
+        self.assertEqual(loaded, [])
+
+    def test_import_main(self):
+        self.assertNotLoaded(loaded_modules("import wacz.main"))
+
+    def test_version(self):
+        modules = loaded_modules(
+            "from wacz.main import main\n"
+            "try:\n"
+            "    main(['--version'])\n"
+            "except SystemExit:\n"
+            "    pass"
+        )
+        self.assertNotLoaded(modules)
+
+    def test_help(self):
+        modules = loaded_modules(
+            "from wacz.main import main\n"
+            "try:\n"
+            "    main(['create', '--help'])\n"
+            "except SystemExit:\n"
+            "    pass"
+        )
+        self.assertNotLoaded(modules)
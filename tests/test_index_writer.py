@@ -0,0 +1,196 @@
+import unittest
+import tempfile
+import os
+import random
+import zipfile
+import gzip
+import json
+from io import StringIO, BytesIO
+from cdxj_indexer.main import CompressedWriter
+from wacz.main import main
+from wacz.indexwriter import SpillingSortWriter, ParallelCompressedWriter
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+
+
+def sort_unique(lines):
+    out = []
+    for line in sorted(lines):
+        if not out or out[-1] != line:
+            out.append(line)
+    return out
+
+
+class TestSpillingSortWriter(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(42)
+        self.lines = [
+            "com,example)/%d 2020%010d {}\n"
+            % (rand.randint(0, 500), rand.randint(0, 3))
+            for i in range(2000)
+        ]
+
+    def test_in_memory_sort(self):
+        out = StringIO()
+        writer = SpillingSortWriter(out)
+        for line in self.lines:
+            writer.write(line)
+        writer.flush()
+
+        self.assertEqual(writer.num_spilled, 0)
+        self.assertEqual(out.getvalue(), "".join(sort_unique(self.lines)))
+
+    def test_spilled_sort_matches_in_memory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out = StringIO()
+            writer = SpillingSortWriter(out, max_memory=2048, temp_dir=tmpdir)
+            for line in self.lines:
+                writer.write(line)
+            writer.flush()
+
+            self.assertTrue(writer.num_spilled > 1)
+            self.assertEqual(out.getvalue(), "".join(sort_unique(self.lines)))
+
+            # all spilled runs removed after merge
+            self.assertEqual(os.listdir(tmpdir), [])
+
+    def test_create_with_sort_memory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            in_memory = os.path.join(tmpdir, "in-memory.wacz")
+            spilled = os.path.join(tmpdir, "spilled.wacz")
+            inputs = [
+                os.path.join(TEST_DIR, "example-collection.warc"),
+                os.path.join(TEST_DIR, "example-iana.warc"),
+            ]
+
+            self.assertEqual(main(["create", "-o", in_memory] + inputs), 0)
+            self.assertEqual(
+                main(
+                    [
+                        "create",
+                        "-o",
+                        spilled,
+                        "--sort-memory",
+                        "1K",
+                        "--sort-temp-dir",
+                        tmpdir,
+                    ]
+                    + inputs
+                ),
+                0,
+            )
+
+            with zipfile.ZipFile(in_memory) as zf_1, zipfile.ZipFile(spilled) as zf_2:
+                for filename in ("indexes/index.cdx.gz", "indexes/index.idx"):
+                    self.assertEqual(zf_1.read(filename), zf_2.read(filename))
+
+            self.assertEqual(
+                sorted(os.listdir(tmpdir)), ["in-memory.wacz", "spilled.wacz"]
+            )
+
+
+class TestParallelCompressedWriter(unittest.TestCase):
+    def setUp(self):
+        self.lines = sort_unique(
+            [
+                'com,example)/%d 2020%010d {"url": "https://example.com/%d"}\n'
+                % (i, i, i)
+                for i in range(1000)
+            ]
+        )
+
+    def write(self, writer_cls, lines, **kwargs):
+        index_out = StringIO()
+        data_out = BytesIO()
+        writer = writer_cls(
+            index_out,
+            data_out,
+            num_lines=64,
+            data_out_name="index.cdx.gz",
+            digest_records=True,
+            **kwargs
+        )
+        for line in lines:
+            writer.write(line)
+        writer.flush()
+
+        return index_out.getvalue(), data_out.getvalue()
+
+    def test_same_as_serial(self):
+        serial = self.write(CompressedWriter, self.lines)
+
+        for threads in (1, 2, 8):
+            self.assertEqual(
+                self.write(ParallelCompressedWriter, self.lines, threads=threads),
+                serial,
+            )
+
+    def test_idx_offsets(self):
+        idx, data = self.write(ParallelCompressedWriter, self.lines, threads=4)
+        idx_lines = idx.strip().split("\n")
+
+        self.assertTrue(idx_lines[0].startswith("!meta 0 "))
+        self.assertEqual(len(idx_lines) - 1, (len(self.lines) + 63) // 64)
+
+        for i, idx_line in enumerate(idx_lines[1:]):
+            prefix, block_json = idx_line.split(" {", 1)
+            block = json.loads("{" + block_json)
+            block_data = data[block["offset"] : block["offset"] + block["length"]]
+            block_lines = self.lines[i * 64 : (i + 1) * 64]
+
+            self.assertEqual(
+                gzip.decompress(block_data).decode("utf-8"), "".join(block_lines)
+            )
+            self.assertEqual(prefix, block_lines[0].split(" {", 1)[0])
+
+    def test_exact_multiple_of_block(self):
+        idx, data = self.write(ParallelCompressedWriter, self.lines[:128], threads=2)
+
+        # no empty trailing block
+        self.assertEqual(len(idx.strip().split("\n")), 3)
+        self.assertEqual(
+            gzip.decompress(data).decode("utf-8"), "".join(self.lines[:128])
+        )
+
+    def test_block_size(self):
+        rand = random.Random(1)
+        lines = sort_unique(
+            [
+                'com,example)/%05d 20200101000000 {"req.http:cookie": "%s"}\n'
+                % (i, "%x" % rand.getrandbits(rand.choice([32, 512, 4096])))
+                for i in range(3000)
+            ]
+        )
+
+        outputs = [
+            self.write(
+                ParallelCompressedWriter, lines, threads=threads, block_size=2048
+            )
+            for threads in (1, 3)
+        ]
+
+        # block boundaries don't depend on the number of threads
+        self.assertEqual(outputs[0], outputs[1])
+
+        idx, data = outputs[0]
+        blocks = [
+            json.loads("{" + line.split(" {", 1)[1])
+            for line in idx.strip().split("\n")[1:]
+        ]
+        lengths = [block["length"] for block in blocks]
+
+        # more blocks than with 64 lines per block, each near the target size
+        self.assertTrue(len(blocks) > (len(lines) + 63) // 64)
+        self.assertTrue(all(length < 2048 * 2 for length in lengths[1:]))
+        self.assertTrue(sum(lengths[1:-1]) / len(lengths[1:-1]) > 2048 / 2)
+
+        # all lines written in order
+        self.assertEqual(gzip.decompress(data).decode("utf-8"), "".join(lines))
+
+    def test_empty(self):
+        idx, data = self.write(ParallelCompressedWriter, [], threads=2)
+        self.assertEqual(gzip.decompress(data), b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+import unittest
+import tempfile
+import os
+import json, pstats, tracemalloc
+from wacz.main import main
+from wacz.metrics import Metrics, Timer, add_counts
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+
+INPUTS = [
+    os.path.join(TEST_DIR, "example-collection.warc"),
+    os.path.join(TEST_DIR, "example-iana.warc"),
+]
+
+
+class TestMetrics(unittest.TestCase):
+    def create_metrics(self, tmpdir, name, args):
+        output = os.path.join(tmpdir, name + ".wacz")
+        metrics_json = os.path.join(tmpdir, name + ".json")
+        self.assertEqual(
+            main(
+                ["create", "-o", output, "--metrics-json", metrics_json] + args + INPUTS
+            ),
+            0,
+        )
+
+        with open(metrics_json) as fh:
+            return output, json.load(fh)
+
+    def test_create_metrics(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _, metrics = self.create_metrics(tmpdir, "serial", ["-d", "-t"])
+            _, parallel = self.create_metrics(
+                tmpdir, "parallel", ["-d", "-t", "--workers", "2"]
+            )
+
+        self.assertEqual(metrics["command"], "create")
+        phases = {phase["name"]: phase for phase in metrics["phases"]}
+        self.assertEqual(
+            list(phases),
+            [
+                "pages load",
+                "indexing",
+                "text extraction",
+                "archives",
+                "page lists",
+                "datapackage",
+                "datapackage digest",
+            ],
+        )
+
+        indexing = phases["indexing"]
+        self.assertEqual([entry["filename"] for entry in indexing["inputs"]], INPUTS)
+        self.assertEqual(
+            [entry["bytes"] for entry in indexing["inputs"]],
+            [os.path.getsize(filename) for filename in INPUTS],
+        )
+        self.assertEqual(indexing["records"], metrics["counts"]["records"])
+        self.assertEqual(
+            sum(metrics["counts"]["record_types"].values()), indexing["records"]
+        )
+        self.assertEqual(phases["archives"]["bytes"], indexing["bytes"])
+        self.assertTrue(phases["text extraction"]["pages"] > 0)
+
+        for phase in metrics["phases"]:
+            self.assertTrue(phase["wall_time"] >= 0)
+            self.assertTrue(phase["cpu_time"] >= 0)
+
+        if metrics["peak_rss"]:
+            self.assertTrue(metrics["peak_rss"]["self"] > 0)
+
+        # counts are the same when indexing in worker processes
+        self.assertEqual(parallel["counts"], metrics["counts"])
+        parallel_phases = {phase["name"]: phase for phase in parallel["phases"]}
+        self.assertEqual(
+            parallel_phases["indexing"]["inputs"][1]["records"],
+            indexing["inputs"][1]["records"],
+        )
+        self.assertEqual(
+            parallel_phases["text extraction"]["pages"],
+            phases["text extraction"]["pages"],
+        )
+
+        # the elapsed time is within the run, the time spent in workers is apart
+        for run in (metrics, parallel):
+            text = [p for p in run["phases"] if p["name"] == "text extraction"][0]
+            self.assertTrue(0 <= text["wall_time"] <= run["wall_time"])
+            self.assertTrue(text["worker_time"] > 0)
+            self.assertNotIn("start", text)
+
+    def test_validate_metrics(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output, _ = self.create_metrics(tmpdir, "archive", ["-d"])
+
+            metrics_json = os.path.join(tmpdir, "validate.json")
+            self.assertEqual(
+                main(["validate", "-f", output, "--metrics-json", metrics_json]), 0
+            )
+
+            with open(metrics_json) as fh:
+                metrics = json.load(fh)
+
+            size = os.path.getsize(output)
+
+        self.assertEqual(metrics["command"], "validate")
+        phases = {phase["name"]: phase for phase in metrics["phases"]}
+        self.assertEqual(phases["open"]["bytes"], size)
+        self.assertIn("check_file_hashes", phases)
+        self.assertTrue(phases["check_file_hashes"]["bytes"] > 0)
+
+    def test_phase(self):
+        metrics = Metrics("test")
+        with metrics.phase("first", bytes=10) as phase:
+            phase["items"] = 2
+
+        phase = metrics.start("second")
+        metrics.finish(phase)
+
+        self.assertEqual(
+            [phase["name"] for phase in metrics.phases], ["first", "second"]
+        )
+        self.assertEqual(metrics.phases[0]["items"], 2)
+        self.assertNotIn("_timer", metrics.phases[1])
+
+        counts = {"a": 1}
+        add_counts(counts, {"a": 2, "b": 3})
+        self.assertEqual(counts, {"a": 3, "b": 3})
+
+        with Timer() as timer:
+            sum(range(1000))
+
+        self.assertTrue(timer.wall_time > 0)
+
+    def test_phase_raises(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            metrics = Metrics("test", profile_dir=tmpdir)
+            with metrics.phase("outer"):
+                with self.assertRaises(ValueError):
+                    with metrics.phase("failed"):
+                        raise ValueError("failed")
+
+                # the profile of the outer phase is restored
+                self.assertEqual(metrics.active_profile, "outer")
+
+            self.assertIsNone(metrics.active_profile)
+            self.assertEqual(
+                [phase["name"] for phase in metrics.phases], ["failed", "outer"]
+            )
+            self.assertNotIn("_timer", metrics.phases[0])
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            profile_dir = os.path.join(tmpdir, "profile")
+            output = os.path.join(tmpdir, "archive.wacz")
+            self.assertEqual(
+                main(
+                    [
+                        "create",
+                        "-o",
+                        output,
+                        "-d",
+                        "-t",
+                        "--profile",
+                        profile_dir,
+                        "--profile-memory",
+                    ]
+                    + INPUTS
+                ),
+                0,
+            )
+
+            filenames = sorted(os.listdir(profile_dir))
+            for name in (
+                "indexing",
+                "text-extraction",
+                "archives",
+                "page-lists",
+                "datapackage",
+            ):
+                self.assertIn(name + ".pstats", filenames)
+
+            stats = pstats.Stats(os.path.join(profile_dir, "text-extraction.pstats"))
+            self.assertTrue(any(func[2] == "extract_text" for func in stats.stats))
+
+            snapshots = [name for name in filenames if name.endswith(".tracemalloc")]
+            self.assertEqual(snapshots[0], "01-pages-load.tracemalloc")
+            self.assertEqual(snapshots[1], "02-indexing.tracemalloc")
+            snapshot = tracemalloc.Snapshot.load(
+                os.path.join(profile_dir, snapshots[1])
+            )
+            self.assertTrue(snapshot.traces)
+
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_profile_memory_requires_profile(self):
+        with self.assertRaises(SystemExit):
+            main(["create", "--profile-memory", INPUTS[0]])
@@ -1,8 +1,9 @@
 import unittest
 import tempfile
 import os
-import zipfile, json, gzip
-from wacz.main import main, now
+import zipfile, json, gzip, subprocess, sys, hashlib, io, time
+from contextlib import redirect_stdout
+from wacz.main import main, now, write_archive
 from wacz.util import hash_file
 from unittest.mock import patch
 import jsonlines
@@ -667,6 +668,75 @@ class TestWaczFormat(unittest.TestCase):
 
             assert "sha256" in json_parse["resources"][0]["hash"]
 
+    def test_stream_to_stdout(self):
+        """Passing -o - should stream a valid WACZ to stdout, with messages on stderr"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            proc = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "wacz",
+                    "create",
+                    "-o",
+                    "-",
+                    "--detect-pages",
+                    os.path.join(TEST_DIR, "example-collection.warc"),
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=True,
+            )
+
+            self.assertTrue(proc.stdout.startswith(b"PK"))
+            self.assertIn(b"Generating datapackage.json", proc.stderr)
+
+            output = os.path.join(tmpdir, "streamed.wacz")
+            with open(output, "wb") as fh:
+                fh.write(proc.stdout)
+
+            with zipfile.ZipFile(output) as zf:
+                self.assertIn("pages/pages.jsonl", zf.namelist())
+                for zip_info in zf.infolist():
+                    # written with data descriptors, as stdout is not seekable
+                    self.assertTrue(zip_info.flag_bits & 0x08)
+
+            self.assertEqual(main(["validate", "-f", output]), 0)
+
+    def test_stream_warc_changed_after_indexing(self):
+        """A WARC changed after indexing is hashed while streamed, as the
+        zip can't be read back
+        """
+        filename = os.path.join(TEST_DIR, "example-collection.warc")
+        with open(filename, "rb") as fh:
+            data = fh.read()
+
+        out = UnseekableBuffer()
+        resource_hashes = {}
+        messages = io.StringIO()
+        with redirect_stdout(messages), zipfile.ZipFile(out, "w") as zf:
+            # the digest as indexed, before the WARC changed
+            digest = (len(data) - 1, "sha256:indexed", 0)
+            write_archive(zf, filename, digest, time.time(), "sha256", resource_hashes)
+
+        self.assertIn("changed after indexing", messages.getvalue())
+        self.assertEqual(
+            resource_hashes["archive/example-collection.warc"],
+            (len(data), "sha256:" + hashlib.sha256(data).hexdigest()),
+        )
+
+
+class UnseekableBuffer(io.BytesIO):
+    """Output which can't be read back, like stdout"""
+
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation("seek")
+
+    def tell(self):
+        raise io.UnsupportedOperation("tell")
+
 
 if __name__ == "__main__":
     unittest.main()
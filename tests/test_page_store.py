@@ -0,0 +1,53 @@
+import unittest
+from wacz.pagestore import PageStore
+
+
+class TestPageStore(unittest.TestCase):
+    def test_dict_interface(self):
+        pages = PageStore()
+        self.assertEqual(len(pages), 0)
+
+        pages["b"] = {"url": "https://example.com/b"}
+        pages["a"] = {"url": "https://example.com/a", "title": "A"}
+        pages["c"] = {"url": "https://example.com/c"}
+
+        self.assertEqual(len(pages), 3)
+        self.assertIn("a", pages)
+        self.assertNotIn("d", pages)
+        self.assertEqual(pages["a"], {"url": "https://example.com/a", "title": "A"})
+        self.assertIsNone(pages.get("d"))
+
+        # insertion order, updates keep their position
+        pages["b"] = {"url": "https://example.com/b", "text": "some text"}
+        self.assertEqual(list(pages), ["b", "a", "c"])
+        self.assertEqual(pages["b"]["text"], "some text")
+
+        del pages["a"]
+        pages["a"] = {"url": "https://example.com/a"}
+        self.assertEqual(list(pages.keys()), ["b", "c", "a"])
+        self.assertEqual(
+            [page["url"] for page in pages.values()],
+            [id_ and page["url"] for id_, page in pages.items()],
+        )
+
+        with self.assertRaises(KeyError):
+            pages["d"]
+
+        with self.assertRaises(KeyError):
+            del pages["d"]
+
+        pages.close()
+
+    def test_pages_are_copies(self):
+        pages = PageStore()
+        page = {"url": "https://example.com/"}
+        pages["a"] = page
+        page["title"] = "Changed"
+        pages["a"]["text"] = "not stored"
+
+        self.assertEqual(pages["a"], {"url": "https://example.com/"})
+        pages.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
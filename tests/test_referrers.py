@@ -0,0 +1,94 @@
+import unittest
+import tempfile
+import os
+import pickle
+import zipfile, json
+from wacz.main import main
+from wacz.referrers import make_referrer_set, HashedReferrerSet, BloomReferrerSet
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+
+URLS = ["https://example.com/page-{0}".format(i) for i in range(5000)]
+
+
+def read_page_urls(filename):
+    with zipfile.ZipFile(filename) as zf:
+        lines = zf.read("pages/pages.jsonl").decode("utf-8").strip().split("\n")
+
+    return sorted(json.loads(line)["url"] for line in lines[1:])
+
+
+class TestReferrers(unittest.TestCase):
+    def check_referrer_set(self, referrers):
+        for url in URLS[:2500]:
+            referrers.add(url)
+            referrers.add(url)
+
+        other = pickle.loads(pickle.dumps(type(referrers)(*self.args(referrers))))
+        other.update(URLS[2500:4000])
+        referrers.update(other)
+
+        for url in URLS[:4000]:
+            self.assertIn(url, referrers)
+
+        false_positives = sum(1 for url in URLS[4000:] if url in referrers)
+        return false_positives
+
+    def args(self, referrers):
+        if isinstance(referrers, BloomReferrerSet):
+            return (referrers.capacity, referrers.fp_rate)
+        return ()
+
+    def test_exact(self):
+        referrers = make_referrer_set()
+        self.assertIsInstance(referrers, set)
+        self.assertEqual(self.check_referrer_set(referrers), 0)
+
+    def test_hashed(self):
+        referrers = make_referrer_set("hashed")
+        self.assertEqual(self.check_referrer_set(referrers), 0)
+        self.assertEqual(len(referrers), 4000)
+
+    def test_hashed_compact(self):
+        referrers = HashedReferrerSet()
+        for url in URLS + URLS[::3]:
+            referrers.add(url)
+            # force a compaction with a short unsorted tail
+            if len(referrers.hashes) - referrers.num_sorted >= 100:
+                referrers.compact()
+
+        self.assertEqual(len(referrers), len(URLS))
+        self.assertEqual(list(referrers.hashes), sorted(set(referrers.hashes)))
+        for url in URLS:
+            self.assertIn(url, referrers)
+
+    def test_bloom(self):
+        referrers = make_referrer_set("bloom", 4000, 0.01)
+        false_positives = self.check_referrer_set(referrers)
+        self.assertTrue(false_positives < 50)
+
+    def test_bloom_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            BloomReferrerSet(100, 1.5)
+
+    def test_create_same_pages(self):
+        inputs = [
+            os.path.join(TEST_DIR, "example-iana.warc"),
+            os.path.join(TEST_DIR, "example-collection.warc"),
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outputs = []
+            for mode in ("exact", "hashed", "bloom"):
+                for workers in ("1", "2"):
+                    output = os.path.join(tmpdir, mode + workers + ".wacz")
+                    args = ["create", "-o", output, "-d", "--referrers", mode]
+                    args += ["--workers", workers, "--referrers-capacity", "1000"]
+                    self.assertEqual(main(args + inputs), 0)
+                    outputs.append(read_page_urls(output))
+
+            for pages in outputs[1:]:
+                self.assertEqual(pages, outputs[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
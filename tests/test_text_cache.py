@@ -0,0 +1,128 @@
+import unittest
+import tempfile
+import os
+import io
+import re
+import zipfile, json
+from contextlib import redirect_stdout
+from wacz.main import main
+from wacz.textcache import TextCache
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+
+
+def cache_counts(output):
+    return [int(num) for num in re.search(r"(\d+) hits, (\d+) misses", output).groups()]
+
+
+def read_page_text(filename):
+    with zipfile.ZipFile(filename) as zf:
+        lines = zf.read("pages/pages.jsonl").decode("utf-8").strip().split("\n")
+
+    pages = [json.loads(line) for line in lines[1:]]
+    return sorted((page["url"], page.get("title"), page.get("text")) for page in pages)
+
+
+class TestTextCache(unittest.TestCase):
+    def test_get_put(self):
+        cache = TextCache()
+        self.assertIsNone(cache.get("sha1:ABC"))
+        cache.put("sha1:ABC", ("some text", "Title"))
+        cache.put("sha1:DEF", None)
+
+        self.assertEqual(cache.get("sha1:ABC"), ("some text", "Title"))
+        # failed extraction is cached as empty
+        self.assertEqual(cache.get("sha1:DEF"), ("", ""))
+        self.assertIsNone(cache.get(None))
+
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 1)
+        cache.close()
+
+    def test_temp_dir_removed(self):
+        cache = TextCache()
+        temp_dir = cache.temp_dir
+        self.assertTrue(os.path.isdir(temp_dir))
+        cache.put("sha1:ABC", ("some text", "Title"))
+        self.assertEqual(cache.get("sha1:ABC"), ("some text", "Title"))
+
+        # shared with another process by its dir, once written
+        cache.flush()
+        other = TextCache(cache.cache_dir)
+        self.assertEqual(other.get("sha1:ABC"), ("some text", "Title"))
+        other.close()
+
+        cache.close()
+        self.assertFalse(os.path.exists(temp_dir))
+
+    def test_normalize_digest(self):
+        cache = TextCache()
+        cache.put("sha-256:ABC", ("some text", "Title"))
+        self.assertEqual(cache.get("sha256:ABC"), ("some text", "Title"))
+        self.assertEqual(cache.get("SHA-256:ABC"), ("some text", "Title"))
+        self.assertIsNone(cache.get("sha256:abc"))
+        cache.close()
+
+    def test_batched_writes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = TextCache(tmpdir)
+            other = TextCache(tmpdir)
+            cache.put("sha1:ABC", ("some text", "Title"))
+            self.assertIsNone(other.get("sha1:ABC"))
+
+            # written on close
+            cache.close()
+            self.assertEqual(other.get("sha1:ABC"), ("some text", "Title"))
+            other.close()
+
+    def test_evict_least_recently_used(self):
+        cache = TextCache(max_size=25)
+        cache.put("a", ("a" * 10, ""))
+        cache.put("b", ("b" * 10, ""))
+        cache.put("c", ("c" * 10, ""))
+        cache.get("a")
+
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        cache.close()
+
+    def create(self, output, args):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(
+                main(
+                    ["create", "-o", output, "-d", "-t"]
+                    + args
+                    + [os.path.join(TEST_DIR, "example-iana.warc")]
+                ),
+                0,
+            )
+
+        return out.getvalue()
+
+    def test_reuse_across_runs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, "cache")
+            first = os.path.join(tmpdir, "first.wacz")
+            second = os.path.join(tmpdir, "second.wacz")
+            no_cache = os.path.join(tmpdir, "no-cache.wacz")
+
+            self.create(no_cache, [])
+            hits, misses = cache_counts(self.create(first, ["--text-cache", cache_dir]))
+            self.assertEqual(hits, 0)
+
+            # all extracted text is reused, only payloads without text are missed again
+            hits, misses_second = cache_counts(
+                self.create(second, ["--text-cache", cache_dir, "--text-workers", "2"])
+            )
+            self.assertTrue(hits > 0)
+            self.assertEqual(hits + misses_second, misses)
+
+            self.assertEqual(read_page_text(no_cache), read_page_text(first))
+            self.assertEqual(read_page_text(first), read_page_text(second))
+
+
+if __name__ == "__main__":
+    unittest.main()
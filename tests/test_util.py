@@ -1,10 +1,12 @@
 import unittest
 import tempfile
 import os
-import zipfile, json, gzip, hashlib
+import zipfile, json, gzip, hashlib, zlib
 from io import BytesIO
 
-from wacz.util import hash_stream, validateJSON
+from unittest.mock import patch
+from wacz.util import hash_stream, validateJSON, parse_size, DigestingReader
+from wacz.util import write_stored_entry
 
 TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
 
@@ -30,6 +32,113 @@ class TestUtilFunctions(unittest.TestCase):
         """validate json method should fail with valid json"""
         self.assertFalse(validateJSON('test": "test"}'))
 
+    def test_util_parse_size(self):
+        """parse size should support optional unit suffixes"""
+        self.assertEqual(parse_size("1024"), 1024)
+        self.assertEqual(parse_size("512M"), 512 * 1024 * 1024)
+        self.assertEqual(parse_size("10G"), 10 * 1024 * 1024 * 1024)
+        self.assertEqual(parse_size("1.5kb"), 1536)
+        with self.assertRaises(ValueError):
+            parse_size("invalid")
+
+    def test_util_digesting_reader(self):
+        """digesting reader should hash data once, even if re-read after seeking back"""
+        data = b"0123456789" * 10000
+        reader = DigestingReader(BytesIO(data), "sha256")
+        reader.read(50)
+        reader.seek(10)
+        reader.read(100)
+        while reader.read(4096):
+            pass
+
+        self.assertEqual(
+            reader.get_digest(),
+            (
+                len(data),
+                "sha256:" + hashlib.sha256(data).hexdigest(),
+                zlib.crc32(data),
+            ),
+        )
+
+    def test_util_digesting_reader_incomplete(self):
+        """digesting reader should have no digest if data was skipped or not fully read"""
+        reader = DigestingReader(BytesIO(b"0123456789"), "sha256")
+        reader.read(5)
+        self.assertIsNone(reader.get_digest())
+
+        reader.seek(8)
+        reader.read()
+        reader.read()
+        self.assertIsNone(reader.get_digest())
+
+    def write_zip_direct(self, zip_path, filename, file_size=None):
+        with open(filename, "rb") as fh:
+            data = fh.read()
+
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("first.txt", b"first entry")
+            zip_info = zipfile.ZipInfo.from_file(filename, "archive/example.warc")
+            if file_size is not None:
+                zip_info.file_size = file_size
+            self.assertTrue(
+                write_stored_entry(zf, zip_info, filename, len(data), zlib.crc32(data))
+            )
+            zf.writestr("last.txt", b"last entry")
+
+    def write_zip(self, zip_path, filename):
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("first.txt", b"first entry")
+            zf.write(filename, "archive/example.warc")
+            zf.writestr("last.txt", b"last entry")
+
+    def test_util_write_stored_entry(self):
+        """direct copy of a stored entry should produce the same zip as ZipFile.write"""
+        filename = os.path.join(TEST_DIR, "example-collection.warc")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            expected = os.path.join(tmpdir, "expected.zip")
+            self.write_zip(expected, filename)
+            with open(expected, "rb") as fh:
+                expected_data = fh.read()
+
+            direct = os.path.join(tmpdir, "direct.zip")
+            self.write_zip_direct(direct, filename)
+            with open(direct, "rb") as fh:
+                self.assertEqual(fh.read(), expected_data)
+
+            # fallback to sendfile, then to pread/pwrite
+            with patch("os.copy_file_range", side_effect=OSError, create=True):
+                self.write_zip_direct(direct, filename)
+                with open(direct, "rb") as fh:
+                    self.assertEqual(fh.read(), expected_data)
+
+                with patch("os.sendfile", side_effect=OSError, create=True):
+                    self.write_zip_direct(direct, filename)
+                    with open(direct, "rb") as fh:
+                        self.assertEqual(fh.read(), expected_data)
+
+            with zipfile.ZipFile(direct) as zf:
+                self.assertIsNone(zf.testzip())
+
+    def test_util_write_stored_entry_zip64(self):
+        """zip64 extensions are used based on the size of the file written"""
+        filename = os.path.join(TEST_DIR, "example-collection.warc")
+        with tempfile.TemporaryDirectory() as tmpdir, patch(
+            "zipfile.ZIP64_LIMIT", 1024
+        ):
+            expected = os.path.join(tmpdir, "expected.zip")
+            self.write_zip(expected, filename)
+            with open(expected, "rb") as fh:
+                expected_data = fh.read()
+
+            # file_size of the zip info not set yet
+            direct = os.path.join(tmpdir, "direct.zip")
+            self.write_zip_direct(direct, filename, file_size=0)
+            with open(direct, "rb") as fh:
+                self.assertEqual(fh.read(), expected_data)
+
+            with zipfile.ZipFile(direct) as zf:
+                self.assertIsNone(zf.testzip())
+
 
 if __name__ == "__main__":
     unittest.main()
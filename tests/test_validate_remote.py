@@ -0,0 +1,236 @@
+import unittest
+import tempfile
+import os
+import io
+import re
+import threading
+import time
+import zipfile
+from contextlib import redirect_stdout
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+
+from wacz.main import main
+from wacz.validate import Validation
+from wacz.remote import RangeReader, RangeReaderError
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves the files of the server's directory, with range requests
+    unless the server's ranges is False
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            # the client closed the connection without reading the response
+            pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Range")))
+        if self.path.startswith("/redirect/"):
+            self.send_response(302)
+            self.send_header("Location", self.path[len("/redirect") :])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.path.startswith("/stall/"):
+            time.sleep(2)
+            return
+
+        filename = os.path.join(self.server.directory, self.path.lstrip("/"))
+        if not os.path.isfile(filename):
+            self.send_error(404)
+            return
+
+        with open(filename, "rb") as fh:
+            data = fh.read()
+
+        size = len(data)
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if match and self.server.ranges:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or size - 1), size - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end, size))
+            data = data[start : end + 1]
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+
+        # close the keep-alive connection without telling the client
+        if self.server.drop_connections:
+            self.close_connection = True
+
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class TestValidateRemote(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.wacz = os.path.join(cls.tmpdir.name, "example.wacz")
+        main(
+            [
+                "create",
+                "-o",
+                cls.wacz,
+                "-d",
+                os.path.join(TEST_DIR, "example-collection.warc"),
+                os.path.join(TEST_DIR, "example-iana.warc"),
+            ]
+        )
+
+        # the same wacz, with a modified WARC
+        cls.modified = os.path.join(cls.tmpdir.name, "modified.wacz")
+        with zipfile.ZipFile(cls.wacz) as src:
+            with zipfile.ZipFile(cls.modified, "w") as dest:
+                for info in src.infolist():
+                    data = src.read(info)
+                    if info.filename.endswith("example-iana.warc"):
+                        data += b"\r\n"
+                    dest.writestr(info, data)
+
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        cls.server.directory = cls.tmpdir.name
+        cls.server.requests = []
+        cls.server.ranges = True
+        cls.server.drop_connections = False
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = "http://127.0.0.1:%d/" % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.server.ranges = True
+        self.server.drop_connections = False
+
+    def test_range_reader(self):
+        with open(self.wacz, "rb") as fh:
+            data = fh.read()
+
+        reader = RangeReader(self.base_url + "example.wacz", block_size=1024)
+        self.assertEqual(reader.size, len(data))
+
+        reader.seek(-100, io.SEEK_END)
+        self.assertEqual(reader.read(), data[-100:])
+        self.assertEqual(reader.read(10), b"")
+
+        reader.seek(500)
+        self.assertEqual(reader.read(10), data[500:510])
+        self.assertEqual(reader.tell(), 510)
+        # served from the block already fetched
+        num_requests = reader.num_requests
+        self.assertEqual(reader.read(100), data[510:610])
+        self.assertEqual(reader.num_requests, num_requests)
+
+        self.assertEqual(reader.read(5000), data[610:5610])
+        reader.close()
+
+        # the whole file is never requested
+        self.assertTrue(all(range_ for _, range_ in self.server.requests))
+
+    def test_range_reader_redirect(self):
+        reader = RangeReader(self.base_url + "redirect/example.wacz")
+        self.assertEqual(reader.url, self.base_url + "example.wacz")
+        self.assertEqual(reader.size, os.path.getsize(self.wacz))
+        reader.close()
+
+    def test_range_reader_timeout(self):
+        with self.assertRaises(RangeReaderError):
+            RangeReader(self.base_url + "stall/example.wacz", timeout=0.5)
+
+    def test_range_reader_reconnect(self):
+        with open(self.wacz, "rb") as fh:
+            data = fh.read()
+
+        self.server.drop_connections = True
+        reader = RangeReader(self.base_url + "example.wacz", block_size=1024)
+        reader.seek(2000)
+        self.assertEqual(reader.read(10), data[2000:2010])
+        reader.seek(0)
+        self.assertEqual(reader.read(10), data[:10])
+        self.assertEqual(reader.num_requests, 3)
+        reader.close()
+
+    def test_no_range_support(self):
+        self.server.ranges = False
+        with self.assertRaises(RangeReaderError):
+            RangeReader(self.base_url + "example.wacz")
+
+    def test_no_range_support_not_downloaded(self):
+        """The full response to a request without range support is not read"""
+        with open(os.path.join(self.tmpdir.name, "large.wacz"), "wb") as fh:
+            fh.write(b"\0" * (16 * 1024 * 1024))
+
+        self.server.ranges = False
+        with patch("http.client.HTTPResponse.read") as mock_read:
+            with self.assertRaises(RangeReaderError):
+                RangeReader(self.base_url + "large.wacz")
+
+        mock_read.assert_not_called()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_validate_url(self):
+        for workers in ["1", "4"]:
+            self.server.requests.clear()
+            self.assertEqual(
+                main(
+                    [
+                        "validate",
+                        "-f",
+                        self.base_url + "example.wacz",
+                        "--workers",
+                        workers,
+                    ]
+                ),
+                0,
+            )
+            self.assertTrue(all(range_ for _, range_ in self.server.requests))
+
+    @patch("zipfile.ZipFile.extractall")
+    def test_validate_url_same_as_local(self, mock_extractall):
+        local = Validation(self.modified, workers=2)
+        remote = Validation(self.base_url + "modified.wacz", workers=2)
+
+        self.assertEqual(remote.size, local.size)
+        self.assertEqual(remote.names, local.names)
+        self.assertEqual(remote.datapackage, local.datapackage)
+
+        local_output = io.StringIO()
+        with redirect_stdout(local_output):
+            self.assertFalse(local.check_file_hashes())
+
+        remote_output = io.StringIO()
+        with redirect_stdout(remote_output):
+            self.assertFalse(remote.check_file_hashes())
+
+        self.assertEqual(remote_output.getvalue(), local_output.getvalue())
+        self.assertIn("example-iana.warc", remote_output.getvalue())
+
+        stats = remote.fetch_stats()
+        self.assertEqual(stats["http_requests"], len(self.server.requests))
+        local.close()
+        remote.close()
+        mock_extractall.assert_not_called()
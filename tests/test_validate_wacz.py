@@ -1,4 +1,5 @@
-import unittest, os, zipfile, sys, gzip, json, tempfile
+import unittest, os, zipfile, sys, gzip, json, tempfile, io
+from contextlib import redirect_stdout
 from wacz.main import main
 from frictionless import validate
 from wacz.validate import Validation
@@ -7,6 +8,21 @@ from unittest.mock import patch
 TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
 
 
+def copy_wacz(src_filename, filename, skip=(), update_datapackage=None):
+    """Copy a wacz, without the skipped files, updating its datapackage.json"""
+    with zipfile.ZipFile(src_filename) as src:
+        with zipfile.ZipFile(filename, "w") as dest:
+            for info in src.infolist():
+                if info.filename in skip:
+                    continue
+                data = src.read(info)
+                if info.filename == "datapackage.json" and update_datapackage:
+                    datapackage = json.loads(data)
+                    update_datapackage(datapackage)
+                    data = json.dumps(datapackage).encode("utf-8")
+                dest.writestr(info, data)
+
+
 class TestWaczFormat(unittest.TestCase):
     @classmethod
     @patch("wacz.main.now")
@@ -85,6 +101,171 @@ class TestWaczFormat(unittest.TestCase):
         valid = self.validation_class_invalid.check_file_hashes()
         self.assertFalse(valid)
 
+    @patch("zipfile.ZipFile.extractall")
+    def test_validate_without_extracting(self, mock_extractall):
+        """Validate reads each file from the zip, without extracting it"""
+        self.assertEqual(
+            main(
+                [
+                    "validate",
+                    "-f",
+                    os.path.join(self.tmpdir.name, "valid_example_1.wacz"),
+                ]
+            ),
+            0,
+        )
+        mock_extractall.assert_not_called()
+
+    def test_deflated_warc_invalid(self):
+        """Correctly fail on a wacz with a modified or compressed WARC"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "deflated.wacz")
+            with zipfile.ZipFile(
+                os.path.join(self.tmpdir.name, "valid_example_1.wacz")
+            ) as src:
+                with zipfile.ZipFile(filename, "w") as dest:
+                    for info in src.infolist():
+                        data = src.read(info)
+                        if info.filename.startswith("archive/"):
+                            info.compress_type = zipfile.ZIP_DEFLATED
+                            data += b"\r\n"
+                        dest.writestr(info, data)
+
+            validation_class = Validation(filename)
+            self.assertFalse(validation_class.check_compression())
+            self.assertFalse(validation_class.check_file_hashes())
+            validation_class.close()
+
+            self.assertEqual(main(["validate", "-f", filename]), 1)
+
+    def test_hashes_with_workers(self):
+        """Hash in threads with --workers, reporting all nonmatching files"""
+        self.assertEqual(
+            main(
+                [
+                    "validate",
+                    "-f",
+                    os.path.join(self.tmpdir.name, "valid_example_1.wacz"),
+                    "--workers",
+                    "4",
+                ]
+            ),
+            0,
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "modified.wacz")
+            with zipfile.ZipFile(
+                os.path.join(self.tmpdir.name, "valid_example_1.wacz")
+            ) as src:
+                with zipfile.ZipFile(filename, "w") as dest:
+                    for info in src.infolist():
+                        data = src.read(info)
+                        if info.filename.startswith(("archive/", "pages/")):
+                            data += b"\n"
+                        dest.writestr(info, data)
+
+            validation_class = Validation(filename, workers=4)
+            output = io.StringIO()
+            with redirect_stdout(output):
+                self.assertFalse(validation_class.check_file_hashes())
+            validation_class.close()
+
+        self.assertIn("archive/example-collection.warc", output.getvalue())
+        self.assertIn("pages/pages.jsonl", output.getvalue())
+        self.assertNotIn("indexes/index.cdx.gz", output.getvalue())
+
+    def test_listed_file_missing_invalid(self):
+        """Correctly fail on a wacz missing a file listed in the datapackage"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "missing.wacz")
+            copy_wacz(
+                os.path.join(self.tmpdir.name, "valid_example_1.wacz"),
+                filename,
+                skip=["archive/example-collection.warc"],
+            )
+
+            validation_class = Validation(filename)
+            self.assertFalse(validation_class.check_file_paths())
+            validation_class.close()
+
+            self.assertEqual(main(["validate", "-f", filename]), 1)
+
+    def test_size_mismatch_invalid(self):
+        """Correctly fail on a wacz with a file size not matching the datapackage"""
+
+        def update_datapackage(datapackage):
+            for resource in datapackage["resources"]:
+                if resource["path"] == "pages/pages.jsonl":
+                    resource["bytes"] += 1
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "size.wacz")
+            copy_wacz(
+                os.path.join(self.tmpdir.name, "valid_example_1.wacz"),
+                filename,
+                update_datapackage=update_datapackage,
+            )
+
+            validation_class = Validation(filename)
+            output = io.StringIO()
+            with redirect_stdout(output):
+                self.assertFalse(validation_class.check_file_hashes())
+            validation_class.close()
+
+            self.assertIn("pages/pages.jsonl's size", output.getvalue())
+
+    def copy_without(self, filename, paths):
+        """Copy the valid wacz without these files, otherwise valid"""
+
+        def update_datapackage(datapackage):
+            datapackage["resources"] = [
+                resource
+                for resource in datapackage["resources"]
+                if resource["path"] not in paths
+            ]
+
+        copy_wacz(
+            os.path.join(self.tmpdir.name, "valid_example_1.wacz"),
+            filename,
+            # without a digest of the updated datapackage
+            skip=paths + ["datapackage-digest.json"],
+            update_datapackage=update_datapackage,
+        )
+
+    def test_missing_index_invalid(self):
+        """Correctly fail the overall command on a wacz with no index"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "no-index.wacz")
+            self.copy_without(filename, ["indexes/index.cdx.gz", "indexes/index.idx"])
+
+            validation_class = Validation(filename)
+            self.assertEqual(validation_class.check_required_contents(), 1)
+            validation_class.close()
+
+            output = io.StringIO()
+            with redirect_stdout(output):
+                self.assertEqual(main(["validate", "-f", filename]), 1)
+
+            self.assertIn("An index file is missing", output.getvalue())
+            self.assertNotIn("Validation succeeded", output.getvalue())
+
+    def test_missing_pages_valid(self):
+        """A wacz with no pages, as created from WARCs without pages, is valid"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "no-pages.wacz")
+            self.copy_without(filename, ["pages/pages.jsonl"])
+
+            validation_class = Validation(filename)
+            self.assertEqual(validation_class.check_required_contents(), 0)
+            validation_class.close()
+
+            output = io.StringIO()
+            with redirect_stdout(output):
+                self.assertEqual(main(["validate", "-f", filename]), 0)
+
+            self.assertIn("No pages.jsonl found", output.getvalue())
+
     def test_ability_to_detect_hash_md5(self):
         """Correctly identify the hash type of a file as md5"""
         tmpdir = tempfile.TemporaryDirectory()
@@ -1,9 +1,13 @@
 import unittest
 import tempfile
 import os
-import zipfile, json, gzip
+import zipfile, json, gzip, zlib
+from io import StringIO
 from wacz.main import main, now
 from wacz.waczindexer import WACZIndexer
+from wacz.util import hash_file
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
 
 PAGE_INDEX = "pages/pages.jsonl"
 
@@ -78,6 +82,32 @@ class TestWaczIndexerFunctions(unittest.TestCase):
             },
         )
 
+    def test_input_digests_computed_while_indexing(self):
+        """The hash, size and crc32 of each input should be computed during indexing"""
+        inputs = [
+            os.path.join(TEST_DIR, "example-collection.warc"),
+            os.path.join(TEST_DIR, "example-resource.warc.gz"),
+        ]
+        wacz_indexer = WACZIndexer(
+            StringIO(),
+            inputs,
+            sort=True,
+            post_append=True,
+            digest_records=True,
+            fields="referrer,req.http:cookie",
+            hash_type="md5",
+        )
+        wacz_indexer.process_all()
+
+        for filename in inputs:
+            with open(filename, "rb") as fh:
+                data = fh.read()
+
+            self.assertEqual(
+                wacz_indexer.input_digests[filename],
+                (len(data), hash_file("md5", filename), zlib.crc32(data)),
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
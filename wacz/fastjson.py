@@ -0,0 +1,75 @@
+import os, json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+"""
+JSON Backend, using orjson when installed and stdlib json otherwise.
+Set WACZ_JSON_BACKEND=json to force stdlib json.
+
+Used for parsing, and for data stored internally while creating a WACZ.
+The page lists and datapackage written to the WACZ are serialized with
+output_dumps(), which only uses orjson when set with WACZ_JSON_BACKEND=orjson:
+its output parses to the same values, but is compact and writes non-ASCII
+characters as UTF-8, rather than in the format of earlier versions.
+"""
+
+JSON_BACKEND_ENV = "WACZ_JSON_BACKEND"
+
+# orjson.JSONDecodeError is a subclass
+JSONDecodeError = json.JSONDecodeError
+
+
+def json_dumps(obj, indent=None):
+    return json.dumps(obj, indent=indent)
+
+
+def json_loads(data):
+    return json.loads(data)
+
+
+def orjson_dumps(obj, indent=None):
+    # orjson only supports an indent of 2
+    if indent and indent != 2:
+        return json.dumps(obj, indent=indent)
+
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode(
+            "utf-8"
+        )
+    except TypeError:
+        # orjson only supports str keys and 64-bit ints
+        return json.dumps(obj, indent=indent)
+
+
+def orjson_loads(data):
+    return orjson.loads(data)
+
+
+BACKENDS = {"json": (json_dumps, json_loads)}
+
+if orjson:
+    BACKENDS["orjson"] = (orjson_dumps, orjson_loads)
+
+
+def get_backend_name():
+    """Backend set in the environment, or the fastest installed"""
+    name = os.environ.get(JSON_BACKEND_ENV)
+    if name in BACKENDS:
+        return name
+
+    if name:
+        print("Warning: JSON backend {0} not available, using default".format(name))
+
+    return "orjson" if orjson else "json"
+
+
+BACKEND = get_backend_name()
+
+dumps, loads = BACKENDS[BACKEND]
+
+OUTPUT_BACKEND = "orjson" if os.environ.get(JSON_BACKEND_ENV) == "orjson" else "json"
+
+output_dumps = BACKENDS[OUTPUT_BACKEND][0] if OUTPUT_BACKEND in BACKENDS else json_dumps
@@ -0,0 +1,282 @@
+import os, heapq, tempfile, json, zlib, hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+CDXJ Index Writers
+"""
+
+# extra fields added to the default CDXJ fields
+DEFAULT_INDEX_FIELDS = "referrer,req.http:cookie"
+
+# how values of extra fields over the max field size are shortened
+OVERSIZE_MODES = ("truncate", "hash")
+
+# default memory budget for sorting index lines before spilling to disk
+DEFAULT_SORT_MEMORY = 1024 * 1024 * 256
+
+# approximate per-line overhead of a python str in the sort buffer
+LINE_OVERHEAD = 64
+
+# max number of sorted runs merged at once
+MAX_MERGE_RUNS = 128
+
+# default number of threads compressing index blocks
+DEFAULT_COMPRESS_THREADS = min(4, os.cpu_count() or 1)
+
+# max number of blocks being compressed, per thread
+PENDING_BLOCKS_PER_THREAD = 2
+
+# with a target block size, number of most recent blocks not used to estimate
+# the compression ratio, so that they may still be compressing
+RATIO_LAG = 8
+
+# compression ratio assumed for the first block
+INITIAL_COMPRESS_RATIO = 0.2
+
+
+# ============================================================================
+class SpillingSortWriter:
+    """Sorts and de-duplicates index lines, keeping at most max_memory bytes
+    of lines in memory. When the budget is exceeded, the buffered lines are
+    sorted and spilled to a run file in temp_dir, and all runs are stream-merged
+    into the output on flush. The output is identical to an in-memory sort.
+    """
+
+    def __init__(self, out, max_memory=None, temp_dir=None):
+        self.out = out
+        self.max_memory = max_memory or DEFAULT_SORT_MEMORY
+        self.temp_dir = temp_dir
+
+        self.lines = []
+        self.size = 0
+        self.runs = []
+        self.num_spilled = 0
+
+    def write(self, line):
+        self.lines.append(line)
+        self.size += len(line) + LINE_OVERHEAD
+
+        if self.size >= self.max_memory:
+            self.spill()
+
+    def add_run(self, filename, delete=False):
+        """Add an already sorted run file to be merged on flush"""
+        self.runs.append((filename, delete))
+
+    def spill(self):
+        self.lines.sort()
+        self.runs.append((self.write_run(self.lines), True))
+        self.num_spilled += 1
+        self.lines = []
+        self.size = 0
+
+    def write_run(self, iter_):
+        with tempfile.NamedTemporaryFile(
+            mode="wt",
+            encoding="utf-8",
+            dir=self.temp_dir,
+            prefix="wacz-sort-",
+            suffix=".cdxj",
+            delete=False,
+        ) as out:
+            self.write_unique(iter_, out)
+
+        return out.name
+
+    def flush(self):
+        if not self.runs:
+            self.lines.sort()
+            self.write_unique(self.lines, self.out)
+        else:
+            if self.lines:
+                self.spill()
+
+            # merge in passes to limit the number of open files
+            while len(self.runs) > MAX_MERGE_RUNS:
+                runs = self.runs[:MAX_MERGE_RUNS]
+                self.runs = self.runs[MAX_MERGE_RUNS:]
+                self.runs.append((self.merge_runs(runs, None), True))
+
+            self.merge_runs(self.runs, self.out)
+            self.runs = []
+
+        self.lines = []
+        self.size = 0
+        self.out.flush()
+
+    def merge_runs(self, runs, out):
+        run_files = [open(name, "rt", encoding="utf-8") for name, _ in runs]
+        try:
+            merged = heapq.merge(*run_files)
+            if out:
+                self.write_unique(merged, out)
+                return None
+            else:
+                return self.write_run(merged)
+        finally:
+            for run_file in run_files:
+                run_file.close()
+
+            for name, delete in runs:
+                if delete:
+                    os.remove(name)
+
+    def write_unique(self, iter_, out):
+        lastline = None
+        for line in iter_:
+            if lastline != line:
+                out.write(line)
+            lastline = line
+
+
+# ============================================================================
+class ParallelCompressedWriter:
+    """Writes sorted index lines as ZipNum blocks, each a separate gzip member,
+    and an idx line for each block. Blocks are compressed in a thread pool, as
+    zlib and hashlib release the GIL, and written in order, so the output is
+    the same as compressing serially.
+
+    A block is at most num_lines lines. If block_size is set, a block is also
+    ended once its estimated compressed size reaches block_size bytes. The
+    estimate uses the compression ratio of the blocks before the last
+    RATIO_LAG blocks, so that block boundaries don't depend on the number of
+    threads.
+    """
+
+    def __init__(
+        self,
+        index_out,
+        data_out,
+        num_lines,
+        data_out_name="",
+        digest_records=False,
+        threads=None,
+        block_size=None,
+    ):
+        self.index_out = index_out
+        self.data_out = data_out
+        self.num_lines = num_lines
+        self.data_out_name = data_out_name
+        self.digest_records = digest_records
+        self.threads = threads or DEFAULT_COMPRESS_THREADS
+        self.block_size = block_size
+
+        self.block = []
+        self.block_bytes = 0
+        self.block_limit = None
+        self.prefix = ""
+        self.offset = 0
+        self.num_blocks = 0
+        self.num_submitted = 0
+        self.header_written = False
+
+        # cumulative (uncompressed, compressed) size after each written block
+        self.totals = []
+
+        self.executor = None
+        self.pending = deque()
+
+    def write_header(self):
+        meta = json.dumps({"format": "cdxj-gzip-1.0", "filename": self.data_out_name})
+
+        self.index_out.write("!meta 0 {0}\n".format(meta))
+        self.header_written = True
+
+    def write(self, line):
+        if not self.block:
+            self.prefix = line.split("{", 1)[0].strip()
+            if not self.header_written:
+                self.write_header()
+
+            if self.block_size:
+                self.block_limit = self.get_block_limit()
+
+        self.block.append(line)
+        self.block_bytes += len(line)
+
+        if len(self.block) >= self.num_lines or (
+            self.block_limit and self.block_bytes >= self.block_limit
+        ):
+            self.submit_block()
+
+    def get_block_limit(self):
+        """Uncompressed size at which the block reaches block_size compressed"""
+        num_known = max(min(self.num_submitted, 1), self.num_submitted - RATIO_LAG)
+        if not num_known:
+            return self.block_size / INITIAL_COMPRESS_RATIO
+
+        # wait for the blocks used in the estimate
+        while self.num_blocks < num_known:
+            self.write_next_pending()
+
+        uncompressed, compressed = self.totals[num_known - 1]
+        return self.block_size * uncompressed / max(compressed, 1)
+
+    def submit_block(self):
+        block, self.block = self.block, []
+        size, self.block_bytes = self.block_bytes, 0
+        self.num_submitted += 1
+
+        if self.threads <= 1:
+            self.write_block(
+                self.prefix, size, *compress_block(block, self.digest_records)
+            )
+            return
+
+        if not self.executor:
+            self.executor = ThreadPoolExecutor(max_workers=self.threads)
+
+        future = self.executor.submit(compress_block, block, self.digest_records)
+        self.pending.append((self.prefix, size, future))
+
+        while len(self.pending) >= self.threads * PENDING_BLOCKS_PER_THREAD:
+            self.write_next_pending()
+
+    def write_next_pending(self):
+        prefix, size, future = self.pending.popleft()
+        self.write_block(prefix, size, *future.result())
+
+    def write_block(self, prefix, size, compressed, digest):
+        length = len(compressed)
+
+        data = {"offset": self.offset, "length": length}
+        if digest:
+            data["digest"] = digest
+
+        self.index_out.write(prefix + " " + json.dumps(data) + "\n")
+        self.data_out.write(compressed)
+        self.offset += length
+        self.num_blocks += 1
+
+        if self.block_size:
+            uncompressed, compressed = self.totals[-1] if self.totals else (0, 0)
+            self.totals.append((uncompressed + size, compressed + length))
+
+    def flush(self):
+        # an empty index is still written as one empty gzip member
+        if self.block or not self.num_submitted:
+            self.submit_block()
+
+        while self.pending:
+            self.write_next_pending()
+
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def compress_block(lines, digest_records):
+    """Compress a block of index lines as a gzip member
+    :returns: compressed block and its digest, if digest_records is set
+    :rtype: tuple
+    """
+    comp = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    compressed = comp.compress("".join(lines).encode("utf-8"))
+    compressed += comp.flush()
+
+    digest = None
+    if digest_records:
+        digest = "sha256:" + hashlib.sha256(compressed).hexdigest()
+
+    return compressed, digest
@@ -1,16 +1,27 @@
-from argparse import ArgumentParser, RawTextHelpFormatter
-from io import BytesIO, StringIO, TextIOWrapper
-import os, json, datetime, shutil, zipfile, sys, gzip, pkg_resources
-from wacz.waczindexer import WACZIndexer
+from argparse import ArgumentParser, RawTextHelpFormatter, Namespace
+from io import TextIOWrapper
+import os, json, datetime, shutil, zipfile, sys, gzip, time, tempfile
+import shortuuid
+from contextlib import redirect_stdout
 from wacz.util import now, WACZ_VERSION, construct_passed_pages_dict
-from wacz.validate import Validation, OUTDATED_WACZ
 from wacz.util import validateJSON, get_py_wacz_version, validate_pages_jsonl_file
-from warcio.timeutils import iso_date_to_timestamp
+from wacz.util import parse_size, open_hashed_entry, write_stored_entry
+from wacz.util import remove_zip_entry
+from wacz.referrers import REFERRER_MODES
+from wacz.metrics import Metrics, add_counts
+from wacz.indexwriter import DEFAULT_INDEX_FIELDS, OVERSIZE_MODES
+from wacz import fastjson
+
+# the indexer and validator, and their dependencies, are only imported by the
+# subcommands using them, to keep CLI startup fast
 
 """
 WACZ Generator
 """
 
+INDEX_CDX = "indexes/index.cdx.gz"
+INDEX_IDX = "indexes/index.idx"
+
 PAGE_INDEX = "pages/pages.jsonl"
 EXTRA_PAGES_INDEX = "pages/extraPages.jsonl"
 
@@ -34,7 +45,12 @@ def main(args=None):
     create.add_argument("inputs", nargs="+")
     create.add_argument("-f", "--file", action="store_true")
 
-    create.add_argument("-o", "--output", default="archive.wacz")
+    create.add_argument(
+        "-o",
+        "--output",
+        default="archive.wacz",
+        help="Output WACZ file, or - to stream the WACZ to stdout",
+    )
 
     create.add_argument("-e", "--extra-pages")
 
@@ -81,6 +97,31 @@ def main(args=None):
 
     create.add_argument("--split-seeds", action="store_true")
 
+    add_index_args(create)
+
+    create.add_argument(
+        "--metrics-json",
+        help="Write the time, CPU time and bytes processed in each phase, with record counts and peak memory use, to this JSON file",
+    )
+
+    create.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Run each phase under cProfile, writing a .pstats file for each phase to this directory",
+    )
+
+    create.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, also write a tracemalloc snapshot at the end of each phase",
+    )
+
+    create.add_argument(
+        "--max-size",
+        type=parse_size,
+        help="Split the inputs at WARC boundaries into several WACZ files of at most this size of WARC data each, eg. 10G. A manifest listing the parts is also written",
+    )
+
     create.add_argument("--ts")
     create.add_argument("--url")
     create.add_argument("--date")
@@ -96,9 +137,26 @@ def main(args=None):
     create.set_defaults(func=create_wacz)
 
     validate = subparsers.add_parser("validate", help="validate a wacz file")
-    validate.add_argument("-f", "--file", required=True)
+    validate.add_argument(
+        "-f",
+        "--file",
+        required=True,
+        help="WACZ file to validate, or an http(s) URL of a WACZ, read with range requests",
+    )
     validate.set_defaults(func=validate_wacz)
 
+    validate.add_argument(
+        "--metrics-json",
+        help="Write the time, CPU time and bytes processed in each validation phase to this JSON file",
+    )
+
+    validate.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of threads used to hash the files in the WACZ in parallel",
+    )
+
     validate.add_argument(
         "--verify-auth",
         action="store_true",
@@ -110,6 +168,37 @@ def main(args=None):
         help="URL of verify server to verify the signature, if any, in dapackage-digest.json",
     )
 
+    append = subparsers.add_parser("append", help="add WARCs to an existing wacz file")
+    append.add_argument("wacz")
+    append.add_argument("inputs", nargs="+")
+
+    append.add_argument(
+        "-t",
+        "--text",
+        help="Adds a full-text index to the new pages. Must be run with --detect-pages",
+        action="store_true",
+    )
+
+    append.add_argument(
+        "-d",
+        "--detect-pages",
+        help="Detects pages in the new WARCs and adds them to pages.jsonl",
+        action="store_true",
+    )
+
+    add_index_args(append)
+
+    append.add_argument("--title")
+    append.add_argument("--desc")
+
+    append.add_argument(
+        "--signing-url",
+        help="URL of signing server to obtain signature for datapackage-digest.json",
+    )
+    append.add_argument("--signing-token", help="Auth token for signing URL")
+
+    append.set_defaults(func=append_wacz)
+
     cmd = parser.parse_args(args=args)
 
     if cmd.cmd == "create" and cmd.ts is not None and cmd.url is None:
@@ -120,18 +209,153 @@ def main(args=None):
             "--pages and --detect-pages can't be set at the same time they cancel each other out."
         )
 
+    if cmd.cmd == "create" and cmd.profile_memory and not cmd.profile:
+        parser.error("--profile-memory requires --profile")
+
+    if cmd.cmd == "create" and cmd.max_size is not None:
+        if cmd.output == "-":
+            parser.error("--max-size can't be used when streaming to stdout")
+        if cmd.url is not None:
+            parser.error("--url and --ts can't be used with --max-size")
+
     value = cmd.func(cmd)
     return value
 
 
+def add_index_args(parser):
+    """Add the options for indexing and page text shared by create and append"""
+    parser.add_argument(
+        "--referrers",
+        choices=REFERRER_MODES,
+        default="exact",
+        help="How referrers are tracked to filter detected pages: exact urls (default), 64-bit url hashes, or a bloom filter using less memory",
+    )
+
+    parser.add_argument(
+        "--referrers-capacity",
+        type=int,
+        help="Expected number of distinct referrers, used to size the bloom filter (default 10000000)",
+    )
+
+    parser.add_argument(
+        "--referrers-fp-rate",
+        type=float,
+        help="False positive rate of the bloom filter (default 0.001)",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to index WARCs in parallel, one WARC per process",
+    )
+
+    parser.add_argument(
+        "--text-workers",
+        type=int,
+        default=1,
+        help="Number of processes used to extract page text with --text, while indexing continues",
+    )
+
+    parser.add_argument(
+        "--text-cache",
+        help="Directory of a cache of extracted page text, keyed by payload digest and reused across runs",
+    )
+
+    parser.add_argument(
+        "--text-cache-size",
+        type=parse_size,
+        help="Max size of the text cache, eg. 2G (default 1G). Least recently used entries are evicted",
+    )
+
+    parser.add_argument(
+        "--index-fields",
+        default=DEFAULT_INDEX_FIELDS,
+        help="Comma-separated extra fields added to each index line (default %(default)s). An empty value adds none",
+    )
+
+    parser.add_argument(
+        "--max-field-size",
+        type=parse_size,
+        help="Max size of the value of each extra index field, eg. 1K. Larger values are truncated or hashed",
+    )
+
+    parser.add_argument(
+        "--oversize-fields",
+        choices=OVERSIZE_MODES,
+        default="truncate",
+        help="Truncate extra index field values over --max-field-size, or replace them with their sha256 hash",
+    )
+
+    parser.add_argument(
+        "--compress-threads",
+        type=int,
+        help="Number of threads compressing index blocks in parallel (default up to 4)",
+    )
+
+    parser.add_argument(
+        "--block-size",
+        type=parse_size,
+        help="Target compressed size of each index block, eg. 32K. By default, blocks are only limited by --lines",
+    )
+
+    parser.add_argument(
+        "--lines",
+        type=int,
+        default=DEFAULT_NUM_LINES,
+        help="Max number of lines in each index block (default %(default)s)",
+    )
+
+    parser.add_argument(
+        "--sort-memory",
+        type=parse_size,
+        help="Memory budget for sorting the index, eg. 512M. Sorted runs are spilled to disk when exceeded",
+    )
+
+    parser.add_argument(
+        "--sort-temp-dir",
+        help="Directory for temporary index runs, defaults to the system temp directory",
+    )
+
+
 def get_version():
     return "%(prog)s " + get_py_wacz_version() + " -- WACZ File Format: " + WACZ_VERSION
 
 
 def validate_wacz(res):
-    validate = Validation(
-        res.file, verify_auth=res.verify_auth, verifier_url=res.verifier_url
-    )
+    metrics = Metrics("validate")
+    result = run_validation(res, metrics)
+
+    if res.metrics_json:
+        metrics.write(res.metrics_json)
+
+    return result
+
+
+def run_validation(res, metrics):
+    from wacz.validate import Validation
+
+    with metrics.phase("open") as phase:
+        validate = Validation(
+            res.file,
+            verify_auth=res.verify_auth,
+            verifier_url=res.verifier_url,
+            workers=res.workers,
+        )
+        phase["bytes"] = validate.size
+
+    try:
+        return run_checks(validate, metrics)
+    finally:
+        if validate.reader:
+            add_counts(metrics.counts, validate.fetch_stats())
+
+        validate.close()
+
+
+def run_checks(validate, metrics):
+    from wacz.validate import OUTDATED_WACZ
+
     version = validate.version
     validation_tests = []
 
@@ -152,7 +376,19 @@ def validate_wacz(res):
         return 1
 
     for func in validation_tests:
-        success = func()
+        with metrics.phase(func.__name__) as phase:
+            if func == validate.check_file_hashes:
+                phase["bytes"] = sum(
+                    resource.get("bytes", 0)
+                    for resource in validate.datapackage.get("resources", [])
+                )
+
+            success = func()
+
+        # check_required_contents returns non-zero on failure, the others False
+        if func == validate.check_required_contents:
+            success = success == 0
+
         if success is False:
             print("Validation failed, the passed WACZ is invalid")
             return 1
@@ -162,23 +398,200 @@ def validate_wacz(res):
 
 
 def create_wacz(res):
-    wacz = zipfile.ZipFile(res.output, "w")
+    metrics = Metrics("create", res.profile, res.profile_memory)
 
-    # write index
-    data_file = zipfile.ZipInfo("indexes/index.cdx.gz", now())
+    if res.max_size:
+        result = create_split_wacz(res, metrics)
 
-    index_file = zipfile.ZipInfo("indexes/index.idx", now())
-    index_file.compress_type = zipfile.ZIP_DEFLATED
+    elif res.output == "-":
+        # stream the WACZ to stdout, writing progress messages to stderr
+        output = sys.stdout.buffer
+        with redirect_stdout(sys.stderr):
+            result = write_wacz(res, output, metrics=metrics)
 
-    index_buff = BytesIO()
+        output.flush()
 
-    text_wrap = TextIOWrapper(index_buff, "utf-8", write_through=True)
+    else:
+        result = write_wacz(res, res.output, metrics=metrics)
+
+    metrics.close()
+
+    if res.metrics_json:
+        metrics.write(res.metrics_json)
+
+    return result
+
+
+def create_split_wacz(res, metrics=None):
+    """Splits the inputs at WARC boundaries into parts of at most max_size
+    bytes of WARCs, and writes each part as a complete WACZ, followed by a
+    multi-wacz manifest listing the parts. Each WARC is still read once.
+    """
+    groups = split_inputs(res.inputs, res.max_size)
+    if len(groups) <= 1:
+        return write_wacz(res, res.output, metrics=metrics)
+
+    if metrics is None:
+        metrics = Metrics("create")
+
+    stem, ext = os.path.splitext(res.output)
+    ext = ext or ".wacz"
+
+    # passed pages are matched across all the parts, unmatched pages are reported at the end
+    passed_pages = None
+    if res.pages != None and not res.copy_pages:
+        with metrics.phase("pages load") as phase:
+            passed_pages = load_passed_pages(res.pages)
+            phase["bytes"] = os.path.getsize(res.pages)
+
+    resources = []
+    for num, inputs in enumerate(groups, 1):
+        part_res = Namespace(**vars(res))
+        part_res.inputs = inputs
+
+        # logs and copied page lists are only added to the first part
+        if num > 1:
+            part_res.log_directory = None
+            part_res.extra_pages = None
+            if res.copy_pages:
+                part_res.pages = None
+
+        output = "{0}-{1}{2}".format(stem, num, ext)
+        print("Writing part {0} of {1}: {2}".format(num, len(groups), output))
+
+        result = write_wacz(part_res, output, passed_pages, metrics)
+        if result != 0:
+            return result
+
+        resources.append(
+            {
+                "name": os.path.basename(output),
+                "path": os.path.basename(output),
+                "bytes": os.path.getsize(output),
+            }
+        )
+
+    if passed_pages:
+        report_unmatched_pages(passed_pages)
+
+    manifest = {
+        "profile": "multi-wacz-package",
+        "resources": resources,
+        "title": res.title or os.path.basename(stem),
+        "created": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "software": "py-wacz " + get_py_wacz_version(),
+        "wacz_version": WACZ_VERSION,
+    }
+
+    if res.desc:
+        manifest["description"] = res.desc
+
+    manifest_filename = stem + ".json"
+    print("Writing manifest: {0}".format(manifest_filename))
+    with open(manifest_filename, "wt") as fh:
+        fh.write(json.dumps(manifest, indent=2))
+
+    return 0
+
+
+def split_inputs(inputs, max_size):
+    """Groups the inputs in order, starting a new group when adding the
+    next WARC would exceed max_size. A WARC larger than max_size gets a
+    group of its own.
+    :returns: list of input lists
+    :rtype: list
+    """
+    groups = []
+    group = []
+    group_size = 0
+
+    for filename in inputs:
+        size = os.path.getsize(filename)
+        if size > max_size:
+            print(
+                "Warning: {0} is larger than the max size, adding as a single part".format(
+                    filename
+                )
+            )
+
+        if group and group_size + size > max_size:
+            groups.append(group)
+            group = []
+            group_size = 0
+
+        group.append(filename)
+        group_size += size
+
+    if group:
+        groups.append(group)
+
+    return groups
+
+
+def load_passed_pages(filename):
+    """Streams the passed pages.jsonl, parsing each line once
+    :returns: dict of the passed pages to match while indexing, with the header
+    :rtype: PassedPagesDict
+    """
+
+    def iter_lines(fh):
+        for line in fh:
+            try:
+                yield line.decode("utf-8")
+            except:
+                print("Page data not utf-8 encoded, skipping", line)
+
+    # Create a dict of the passed pages that will be used in the construction of the index
+    with open(filename, "rb") as fh:
+        return construct_passed_pages_dict(iter_lines(fh))
+
+
+def write_valid_pages(fh, out):
+    """Streams the valid json lines of fh to out, joined by newlines"""
+    sep = b""
+    for line in fh:
+        page_str = line.strip()
+        if not page_str:
+            continue
+
+        if not validateJSON(page_str):
+            print(
+                "Warning: Ignoring invalid extra page\n %s"
+                % page_str.decode("utf-8", "replace")
+            )
+            continue
+
+        out.write(sep + page_str)
+        sep = b"\n"
+
+
+def report_unmatched_pages(passed_pages_dict):
+    for key in passed_pages_dict:
+        print("Invalid passed page. We were unable to find a match for %s" % str(key))
+
+
+def write_wacz(res, output, passed_pages=None, metrics=None):
+    """Writes the WACZ to output, which may be a non-seekable stream. All
+    entries are hashed while being written, so the zip is never read back
+    :param passed_pages: dict of passed pages shared with other
+    parts, unmatched pages are then reported by the caller
+    :param metrics: Metrics recording the time taken by each phase
+    """
+    if metrics is None:
+        metrics = Metrics("create")
+
+    wacz = zipfile.ZipFile(output, "w")
 
     wacz_indexer = None
 
     passed_pages_dict = {}
 
+    # hash each entry while writing, to avoid re-reading the zip for the datapackage
+    hash_type = res.hash_type or "sha256"
+    resource_hashes = {}
+
     # Handle pages
+    phase = metrics.start("pages load")
     if res.pages != None:
         if res.copy_pages:
             print("Copying passed pages.jsonl file to WACZ")
@@ -190,25 +603,17 @@ def create_wacz(res):
 
             with open(res.pages, "rb") as fh:
                 pages_jsonl = zipfile.ZipInfo("pages/pages.jsonl", now())
-                with wacz.open(pages_jsonl, "w") as pages_file:
+                with open_hashed_entry(
+                    wacz, pages_jsonl, hash_type, resource_hashes
+                ) as pages_file:
                     shutil.copyfileobj(fh, pages_file)
 
         else:
             print("Validating passed pages.jsonl file")
-            passed_content = []
-            with open(res.pages, "rb") as fh:
-                for line in fh:
-                    if not line:
-                        continue
-
-                    try:
-                        line = line.decode("utf-8")
-                        passed_content.append(line)
-                    except:
-                        print("Page data not utf-8 encoded, skipping", line)
-
-            # Create a dict of the passed pages that will be used in the construction of the index
-            passed_pages_dict = construct_passed_pages_dict(passed_content)
+            if passed_pages is None:
+                passed_pages_dict = load_passed_pages(res.pages)
+            else:
+                passed_pages_dict = passed_pages
 
     if res.extra_pages:
         if res.copy_pages:
@@ -216,74 +621,60 @@ def create_wacz(res):
             if validate_pages_jsonl_file(res.extra_pages):
                 extra_pages_jsonl = zipfile.ZipInfo("pages/extraPages.jsonl", now())
                 with open(res.extra_pages, "rb") as fh:
-                    with wacz.open(extra_pages_jsonl, "w") as extra_pages_file:
+                    with open_hashed_entry(
+                        wacz, extra_pages_jsonl, hash_type, resource_hashes
+                    ) as extra_pages_file:
                         shutil.copyfileobj(fh, extra_pages_file)
             else:
                 print("Ignoring invalid extraPages.jsonl file")
         else:
             print("Validating extra pages file")
-            extra_page_data = []
-            with open(res.extra_pages) as fh:
-                data = fh.read()
-                for page_str in data.strip().split("\n"):
-                    page_json = validateJSON(page_str)
-
-                    if not page_json:
-                        print("Warning: Ignoring invalid extra page\n %s" % page_str)
-                        continue
-
-                    extra_page_data.append(page_str.encode("utf-8"))
-
             extra_pages_file = zipfile.ZipInfo(EXTRA_PAGES_INDEX, now())
-            with wacz.open(extra_pages_file, "w") as efh:
-                efh.write(b"\n".join(extra_page_data))
-
-    print("Reading and Indexing All WARCs")
-    with wacz.open(data_file, "w") as data:
-        wacz_indexer = WACZIndexer(
-            text_wrap,
-            res.inputs,
-            sort=True,
-            post_append=True,
-            compress=data,
-            lines=DEFAULT_NUM_LINES,
-            digest_records=True,
-            fields="referrer,req.http:cookie",
-            data_out_name="index.cdx.gz",
-            hash_type=res.hash_type,
-            main_url=res.url,
-            main_ts=res.ts,
-            detect_pages=res.detect_pages,
-            passed_pages_dict=passed_pages_dict,
-            extract_text=res.text,
-            signing_url=res.signing_url,
-            signing_token=res.signing_token,
-            split_seeds=res.split_seeds,
-        )
-
-        wacz_indexer.process_all()
+            with open(res.extra_pages, "rb") as fh:
+                with open_hashed_entry(
+                    wacz, extra_pages_file, hash_type, resource_hashes
+                ) as efh:
+                    write_valid_pages(fh, efh)
 
-    index_buff.seek(0)
+    # passed pages shared with other parts are loaded by the caller
+    loaded = [res.extra_pages] if passed_pages else [res.pages, res.extra_pages]
+    phase["bytes"] = sum(os.path.getsize(filename) for filename in loaded if filename)
+    metrics.finish(phase)
 
-    with wacz.open(index_file, "w") as index:
-        shutil.copyfileobj(index_buff, index)
+    print("Reading and Indexing All WARCs")
+    indexed_at = time.time()
+    phase = metrics.start("indexing")
+    wacz_indexer = write_index(
+        wacz,
+        res.inputs,
+        hash_type,
+        resource_hashes,
+        main_url=res.url,
+        main_ts=res.ts,
+        passed_pages_dict=passed_pages_dict,
+        split_seeds=res.split_seeds,
+        metrics=metrics,
+        **index_kwargs(res),
+    )
+    add_indexing_metrics(metrics, phase, wacz_indexer)
 
     # write archives
     print("Writing archives...")
+    phase = metrics.start("archives", bytes=0)
     for _input in res.inputs:
-        archive_file = zipfile.ZipInfo.from_file(
-            _input, "archive/" + os.path.basename(_input)
+        write_archive(
+            wacz,
+            _input,
+            wacz_indexer.input_digests.get(_input),
+            indexed_at,
+            hash_type,
+            resource_hashes,
         )
-        with wacz.open(archive_file, "w") as out_fh:
-            with open(_input, "rb") as in_fh:
-                shutil.copyfileobj(in_fh, out_fh)
-                path = "archive/" + os.path.basename(_input)
+        phase["bytes"] += os.path.getsize(_input)
+    metrics.finish(phase)
 
-    if wacz_indexer.passed_pages_dict != None:
-        for key in wacz_indexer.passed_pages_dict:
-            print(
-                "Invalid passed page. We were unable to find a match for %s" % str(key)
-            )
+    if wacz_indexer.passed_pages_dict != None and passed_pages is None:
+        report_unmatched_pages(wacz_indexer.passed_pages_dict)
 
     if res.log_directory:
         print("Writing logs...")
@@ -293,11 +684,14 @@ def create_wacz(res):
             log_wacz_file = zipfile.ZipInfo.from_file(
                 log_path, "logs/{}".format(log_file)
             )
-            with wacz.open(log_wacz_file, "w") as out_fh:
+            with open_hashed_entry(
+                wacz, log_wacz_file, hash_type, resource_hashes
+            ) as out_fh:
                 with open(log_path, "rb") as in_fh:
                     shutil.copyfileobj(in_fh, out_fh)
                     path = "logs/{}".format(log_file)
 
+    phase = metrics.start("page lists")
     if len(wacz_indexer.pages) > 0 and res.pages == None and not res.copy_pages:
         print("Generating page index...")
         # generate pages/text
@@ -319,11 +713,7 @@ def create_wacz(res):
         title_value = "Pages"
 
         # If the user has provided a title or an id in a header of their file we will use those instead of our default.
-        try:
-            header = json.loads(passed_content[0])
-        except:
-            print("Warning: Ignoring invalid page header: " + passed_content[0])
-            header = {}
+        header = passed_pages_dict.header
 
         if "format" in header:
             print("Header detected in the passed pages.jsonl file")
@@ -365,27 +755,371 @@ def create_wacz(res):
 
             wacz_indexer.write_page_list(wacz, filename, pagelist)
 
+    phase["bytes"] = sum(
+        size
+        for filename, (size, _) in resource_hashes.items()
+        if filename.startswith("pages/")
+    )
+    metrics.finish(phase)
+
+    write_datapackage(wacz, wacz_indexer, res, metrics)
+
+    wacz.close()
+
+    return 0
+
+
+def add_indexing_metrics(metrics, phase, wacz_indexer):
+    """Finish the indexing phase, with the bytes, records and time taken to
+    index each input, and add the text extraction phase
+    """
+    inputs = []
+    for filename, stats in wacz_indexer.input_stats.items():
+        entry = {"filename": filename}
+        entry.update(stats)
+        if stats["wall_time"]:
+            entry["records_per_sec"] = stats["records"] / stats["wall_time"]
+        inputs.append(entry)
+
+    phase["bytes"] = sum(entry["bytes"] for entry in inputs)
+    phase["records"] = sum(wacz_indexer.record_counts.values())
+    phase["inputs"] = inputs
+    metrics.finish(phase)
+
+    if phase["wall_time"]:
+        phase["records_per_sec"] = phase["records"] / phase["wall_time"]
+
+    add_counts(metrics.counts, {"records": phase["records"]})
+    add_counts(
+        metrics.counts.setdefault("record_types", {}), wacz_indexer.record_counts
+    )
+    add_counts(metrics.counts, {"pages": len(wacz_indexer.pages)})
+
+    # text is extracted while indexing, possibly in other processes, the wall
+    # time is from the first extraction starting to the last one finishing,
+    # worker_time is the time spent extracting summed across processes
+    text_stats = wacz_indexer.text_stats
+    if text_stats:
+        metrics.add_phase(
+            "text extraction",
+            text_stats["end"] - text_stats["start"],
+            text_stats["cpu_time"],
+            worker_time=text_stats["worker_time"],
+            bytes=text_stats["bytes"],
+            pages=text_stats["pages"],
+        )
+
+
+def index_kwargs(res):
+    """The indexer options shared by create and append, from the add_index_args
+    and page options
+    :rtype: dict
+    """
+    return dict(
+        detect_pages=res.detect_pages,
+        extract_text=res.text,
+        signing_url=res.signing_url,
+        signing_token=res.signing_token,
+        workers=res.workers,
+        text_workers=res.text_workers,
+        compress_threads=res.compress_threads,
+        block_size=res.block_size,
+        lines=res.lines,
+        index_fields=res.index_fields,
+        max_field_size=res.max_field_size,
+        oversize_fields=res.oversize_fields,
+        text_cache=res.text_cache,
+        text_cache_size=res.text_cache_size,
+        referrers=res.referrers,
+        referrers_capacity=res.referrers_capacity,
+        referrers_fp_rate=res.referrers_fp_rate,
+        sort_memory=res.sort_memory,
+        sort_temp_dir=res.sort_temp_dir,
+    )
+
+
+def write_index(wacz, inputs, hash_type, resource_hashes, **kwargs):
+    """Indexes the inputs, writing the compressed index and idx to the WACZ
+    :returns: the WACZIndexer used, with detected pages
+    :rtype: WACZIndexer
+    """
+    from wacz.waczindexer import WACZIndexer
+
+    data_file = zipfile.ZipInfo("indexes/index.cdx.gz", now())
+
+    index_file = zipfile.ZipInfo("indexes/index.idx", now())
+    index_file.compress_type = zipfile.ZIP_DEFLATED
+
+    # spooled to disk, the idx grows with the size of the index
+    index_buff = tempfile.TemporaryFile()
+
+    text_wrap = TextIOWrapper(index_buff, "utf-8", write_through=True)
+
+    index_fields = kwargs.pop("index_fields", None)
+    if index_fields is None:
+        index_fields = DEFAULT_INDEX_FIELDS
+
+    with open_hashed_entry(wacz, data_file, hash_type, resource_hashes) as data:
+        wacz_indexer = WACZIndexer(
+            text_wrap,
+            inputs,
+            sort=True,
+            post_append=True,
+            compress=data,
+            lines=kwargs.pop("lines", None) or DEFAULT_NUM_LINES,
+            digest_records=True,
+            fields=index_fields,
+            data_out_name="index.cdx.gz",
+            hash_type=hash_type,
+            resource_hashes=resource_hashes,
+            **kwargs,
+        )
+
+        wacz_indexer.process_all()
+
+    wacz_indexer.print_field_sizes()
+
+    index_buff.seek(0)
+
+    with open_hashed_entry(wacz, index_file, hash_type, resource_hashes) as index:
+        shutil.copyfileobj(index_buff, index)
+
+    text_wrap.close()
+
+    return wacz_indexer
+
+
+def write_datapackage(wacz, wacz_indexer, res, metrics=None):
+    if metrics is None:
+        metrics = Metrics("create")
+
     # generate datapackage
     print("Generating datapackage.json")
 
+    phase = metrics.start("datapackage")
     datapackage = wacz_indexer.generate_datapackage(res, wacz)
     datapackage_file = zipfile.ZipInfo("datapackage.json", now())
     datapackage_file.compress_type = zipfile.ZIP_DEFLATED
     datapackage_bytes = datapackage.encode("utf-8")
     wacz.writestr(datapackage_file, datapackage_bytes)
+    phase["bytes"] = len(datapackage_bytes)
+    metrics.finish(phase)
 
     print("Generating datapackage-digest.json")
+    # the digest is also signed if a signing url is set
+    phase = metrics.start(
+        "signing" if wacz_indexer.signing_url else "datapackage digest"
+    )
     datapackage_digest_file = zipfile.ZipInfo("datapackage-digest.json", now())
     datapackage_digest_file.compress_type = zipfile.ZIP_DEFLATED
     wacz.writestr(
         datapackage_digest_file,
         wacz_indexer.generate_datapackage_digest(datapackage_bytes),
     )
+    metrics.finish(phase)
+
+
+def append_wacz(res):
+    """Adds WARCs to an existing WACZ. Only the new WARCs are written to
+    archive/, their index is merged with the existing index, and the pages
+    and datapackage are rewritten. Replaced entries are dropped from the
+    central directory, existing archive data is left unchanged.
+    """
+    wacz = zipfile.ZipFile(res.wacz, "a")
+    names = set(wacz.namelist())
+
+    if "datapackage.json" not in names or INDEX_CDX not in names:
+        print("Unable to append, {0} or datapackage.json not found".format(INDEX_CDX))
+        wacz.close()
+        return 1
+
+    for _input in res.inputs:
+        path = "archive/" + os.path.basename(_input)
+        if path in names:
+            print("Unable to append, {0} already exists in WACZ".format(path))
+            wacz.close()
+            return 1
+
+    try:
+        datapackage = json.loads(wacz.read("datapackage.json"))
+        resource_hashes = {
+            resource["path"]: (resource["bytes"], resource["hash"])
+            for resource in datapackage.get("resources", [])
+        }
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        print("Unable to append, invalid datapackage.json: {0!r}".format(e))
+        wacz.close()
+        return 1
+
+    try:
+        hash_type = datapackage["resources"][0]["hash"].split(":")[0]
+    except (KeyError, IndexError):
+        hash_type = "sha256"
+
+    # to restore the existing central directory if appending fails
+    orig_filelist = list(wacz.filelist)
+    orig_start_dir = wacz.start_dir
+
+    with tempfile.TemporaryDirectory(dir=res.sort_temp_dir) as temp_dir:
+        try:
+            result = append_to_wacz(
+                wacz, res, datapackage, hash_type, resource_hashes, temp_dir
+            )
+        except:
+            wacz.filelist = orig_filelist
+            wacz.NameToInfo = {
+                zip_info.filename: zip_info for zip_info in orig_filelist
+            }
+            wacz.start_dir = orig_start_dir
+            wacz.close()
+            raise
 
     wacz.close()
+    return result
 
+
+def append_to_wacz(wacz, res, datapackage, hash_type, resource_hashes, temp_dir):
+    # read existing index and pages before any entries are written
+    old_index = os.path.join(temp_dir, "index.cdxj")
+    with wacz.open(INDEX_CDX) as fh:
+        with gzip.GzipFile(fileobj=fh) as gz_fh, open(old_index, "wb") as out:
+            shutil.copyfileobj(gz_fh, out)
+
+    old_page_lists = {}
+    for filename in (PAGE_INDEX, EXTRA_PAGES_INDEX):
+        if filename in wacz.NameToInfo:
+            old_page_lists[filename] = os.path.join(
+                temp_dir, os.path.basename(filename)
+            )
+            with wacz.open(filename) as fh, open(old_page_lists[filename], "wb") as out:
+                shutil.copyfileobj(fh, out)
+
+    for filename in (
+        INDEX_CDX,
+        INDEX_IDX,
+        "datapackage.json",
+        "datapackage-digest.json",
+    ):
+        remove_zip_entry(wacz, filename)
+
+    print("Reading and Indexing New WARCs")
+    indexed_at = time.time()
+    wacz_indexer = write_index(
+        wacz,
+        res.inputs,
+        hash_type,
+        resource_hashes,
+        sorted_runs=[old_index],
+        **dict(index_kwargs(res), sort_temp_dir=temp_dir),
+    )
+
+    print("Writing archives...")
+    for _input in res.inputs:
+        write_archive(
+            wacz,
+            _input,
+            wacz_indexer.input_digests.get(_input),
+            indexed_at,
+            hash_type,
+            resource_hashes,
+        )
+
+    for filename, pages, id_, title in (
+        (PAGE_INDEX, wacz_indexer.pages, "pages", "Pages"),
+        (EXTRA_PAGES_INDEX, wacz_indexer.extra_pages, "extra-pages", "Extra Pages"),
+    ):
+        if len(pages) == 0:
+            continue
+
+        print("Appending to {0}...".format(filename))
+        remove_zip_entry(wacz, filename)
+        wacz_indexer.write_page_list(
+            wacz,
+            filename,
+            iter_appended_pages(
+                wacz_indexer, old_page_lists.get(filename), pages.values(), id_, title
+            ),
+        )
+
+    for name, pagelist in wacz_indexer.extra_page_lists.items():
+        if name == "pages":
+            name = shortuuid.uuid()
+        filename = PAGE_INDEX_TEMPLATE.format(name)
+
+        remove_zip_entry(wacz, filename)
+        wacz_indexer.write_page_list(wacz, filename, pagelist)
+
+    # keep existing metadata, unless overridden
+    wacz_indexer.title = res.title or datapackage.get("title") or wacz_indexer.title
+    wacz_indexer.desc = res.desc or datapackage.get("description") or wacz_indexer.desc
+    wacz_indexer.main_url = datapackage.get("mainPageURL")
+    wacz_indexer.main_ts = None
+
+    package_res = Namespace(title=None, desc=None, date=datapackage.get("mainPageDate"))
+
+    write_datapackage(wacz, wacz_indexer, package_res)
     return 0
 
 
+def iter_appended_pages(wacz_indexer, old_filename, pages, id_, title):
+    """Yields the existing page list lines followed by the new pages"""
+    new_lines = wacz_indexer.serialize_json_pages(
+        pages, id=id_, title=title, has_text=wacz_indexer.has_text
+    )
+    header = fastjson.loads(next(new_lines))
+
+    if not old_filename:
+        yield fastjson.output_dumps(header) + "\n"
+        yield from new_lines
+        return
+
+    with open(old_filename, "rt", encoding="utf-8") as fh:
+        first_line = fh.readline()
+        try:
+            old_header = fastjson.loads(first_line)
+        except fastjson.JSONDecodeError:
+            old_header = {}
+
+        if "format" in old_header:
+            if header.get("hasText"):
+                old_header["hasText"] = True
+            yield fastjson.output_dumps(old_header) + "\n"
+        else:
+            yield fastjson.output_dumps(header) + "\n"
+            yield first_line.rstrip("\n") + "\n"
+
+        for line in fh:
+            if line.strip():
+                yield line.rstrip("\n") + "\n"
+
+    yield from new_lines
+
+
+def write_archive(wacz, filename, digest, indexed_at, hash_type, resource_hashes):
+    """Copies a WARC into the archive/ directory. If the digest was already
+    computed while indexing and the WARC is unchanged since, it is copied
+    directly in the kernel without hashing it again. Otherwise it is hashed
+    while copying, as the zip may not be read back, eg. when streamed
+    """
+    archive_file = zipfile.ZipInfo.from_file(
+        filename, "archive/" + os.path.basename(filename)
+    )
+
+    if digest:
+        size, hash_, crc = digest
+
+        if os.path.getmtime(filename) < indexed_at and write_stored_entry(
+            wacz, archive_file, filename, size, crc
+        ):
+            resource_hashes[archive_file.filename] = (size, hash_)
+            return
+
+    with open_hashed_entry(wacz, archive_file, hash_type, resource_hashes) as out_fh:
+        with open(filename, "rb") as in_fh:
+            shutil.copyfileobj(in_fh, out_fh)
+
+    if digest and (archive_file.CRC != crc or archive_file.file_size != size):
+        print("Warning: {0} changed after indexing".format(filename))
+
 if __name__ == "__main__":
     main()
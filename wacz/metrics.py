@@ -0,0 +1,224 @@
+import os, sys, json, time, cProfile, tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+"""
+Performance Metrics
+"""
+
+
+def cpu_time():
+    """CPU time of this process and of its finished child processes
+    :returns: user and system time, in seconds
+    :rtype: float
+    """
+    # os.times() is only precise to clock ticks, used for children only
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+def peak_rss():
+    """Peak resident set size of this process and of its largest child process
+    :returns: sizes in bytes, or None if unavailable on this platform
+    :rtype: dict or None
+    """
+    if not resource:
+        return None
+
+    # ru_maxrss is in KiB on Linux, but in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def add_counts(counts, other):
+    """Add the values in other to the values of the same keys in counts"""
+    for key, value in other.items():
+        counts[key] = counts.get(key, 0) + value
+
+
+def add_span_counts(counts, other):
+    """Add the values in other to the values of the same keys in counts,
+    keeping the earliest start and the latest end
+    """
+    for key, value in other.items():
+        if key == "start":
+            counts[key] = min(counts.get(key, value), value)
+        elif key == "end":
+            counts[key] = max(counts.get(key, value), value)
+        else:
+            counts[key] = counts.get(key, 0) + value
+
+
+# ============================================================================
+class Timer:
+    """Measures the wall and CPU time taken by a block"""
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = cpu_time()
+        return self
+
+    def __exit__(self, *args):
+        self.wall_time = time.perf_counter() - self._wall
+        self.cpu_time = cpu_time() - self._cpu
+
+
+# ============================================================================
+class Metrics:
+    """Records the wall and CPU time taken by each phase of a command, with
+    the bytes processed and any other counts, to be written as JSON.
+    If a profile_dir is set, each phase is also run under cProfile, and with
+    trace_memory, a tracemalloc snapshot is taken at the end of each phase
+    """
+
+    def __init__(self, command, profile_dir=None, trace_memory=False):
+        self.command = command
+        self.phases = []
+        self.counts = {}
+
+        self.profile_dir = profile_dir
+        # cProfile profiles by phase name, a repeated phase adds to its profile
+        self.profiles = {}
+        self.active_profile = None
+        self.num_snapshots = 0
+
+        self.trace_memory = trace_memory and bool(profile_dir)
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+        self.started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+        self.timer = Timer().__enter__()
+
+    def start(self, name, **info):
+        """Start timing a phase
+        :returns: the phase entry, which may be updated with the bytes
+        processed or other values for the phase until it is finished
+        :rtype: dict
+        """
+        entry = {"name": name}
+        entry.update(info)
+        entry["_profile"] = self.switch_profile(name)
+        entry["_timer"] = Timer().__enter__()
+        return entry
+
+    def finish(self, entry):
+        """Finish timing a phase, and add it to the phases"""
+        timer = entry.pop("_timer")
+        timer.__exit__()
+        self.switch_profile(entry.pop("_profile"))
+        self.take_snapshot(entry["name"])
+
+        entry["wall_time"] = timer.wall_time
+        entry["cpu_time"] = timer.cpu_time
+        if entry.get("bytes") and timer.wall_time:
+            entry["bytes_per_sec"] = entry["bytes"] / timer.wall_time
+
+        self.phases.append(entry)
+
+    @contextmanager
+    def phase(self, name, **info):
+        """Time the phase run in a with block, a phase which raises is still
+        finished
+        """
+        entry = self.start(name, **info)
+        try:
+            yield entry
+        finally:
+            self.finish(entry)
+
+    @contextmanager
+    def profile(self, name):
+        """Profile the with block separately, eg. work interleaved with
+        another phase, pausing the profile of the current phase
+        """
+        prev = self.switch_profile(name)
+        try:
+            yield
+        finally:
+            self.switch_profile(prev)
+
+    def switch_profile(self, name):
+        """Enable the profile of the named phase, or none if name is None
+        :returns: name of the profile enabled before
+        :rtype: str or None
+        """
+        prev = self.active_profile
+        if not self.profile_dir or name == prev:
+            return prev
+
+        if prev:
+            self.profiles[prev].disable()
+
+        if name:
+            if name not in self.profiles:
+                self.profiles[name] = cProfile.Profile()
+
+            self.profiles[name].enable()
+
+        self.active_profile = name
+        return prev
+
+    def take_snapshot(self, name):
+        if not self.trace_memory:
+            return
+
+        self.num_snapshots += 1
+        filename = "{0:02d}-{1}.tracemalloc".format(
+            self.num_snapshots, name.replace(" ", "-")
+        )
+        tracemalloc.take_snapshot().dump(os.path.join(self.profile_dir, filename))
+
+    def close(self):
+        """Write the profile of each phase to a .pstats file in profile_dir"""
+        if not self.profile_dir:
+            return
+
+        self.switch_profile(None)
+        for name, profile in self.profiles.items():
+            filename = name.replace(" ", "-") + ".pstats"
+            profile.dump_stats(os.path.join(self.profile_dir, filename))
+
+        self.profiles = {}
+
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def add_phase(self, name, wall_time, cpu_time, **info):
+        """Add a phase timed elsewhere, eg. in a worker process"""
+        entry = {"name": name}
+        entry.update(info)
+        entry["wall_time"] = wall_time
+        entry["cpu_time"] = cpu_time
+        self.phases.append(entry)
+
+    def to_dict(self):
+        self.timer.__exit__()
+        return {
+            "command": self.command,
+            "wall_time": self.timer.wall_time,
+            "cpu_time": self.timer.cpu_time,
+            "peak_rss": peak_rss(),
+            "phases": self.phases,
+            "counts": self.counts,
+        }
+
+    def write(self, filename):
+        with open(filename, "wt") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+            fh.write("\n")
@@ -0,0 +1,83 @@
+import sqlite3
+from wacz import fastjson
+
+"""
+Disk-backed Page Store
+"""
+
+# pages cached in memory by sqlite, in KiB
+PAGE_STORE_CACHE_KB = 1024 * 32
+
+
+# ============================================================================
+class PageStore:
+    """Stores pages by id in a temporary SQLite database, which is spilled to
+    disk once it outgrows its cache, instead of keeping all pages and their
+    text in memory. Behaves like an insertion-ordered dict of page dicts.
+    Pages are copies, so a changed page must be set again to be stored.
+    """
+
+    def __init__(self):
+        # an empty filename creates a private temp database, deleted on close
+        self.conn = sqlite3.connect("", isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("PRAGMA cache_size = -{0}".format(PAGE_STORE_CACHE_KB))
+        self.conn.execute(
+            "CREATE TABLE pages (seq INTEGER PRIMARY KEY, id TEXT UNIQUE, data TEXT)"
+        )
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def __contains__(self, id_):
+        return (
+            self.conn.execute("SELECT 1 FROM pages WHERE id = ?", (id_,)).fetchone()
+            is not None
+        )
+
+    def __getitem__(self, id_):
+        row = self.conn.execute(
+            "SELECT data FROM pages WHERE id = ?", (id_,)
+        ).fetchone()
+        if not row:
+            raise KeyError(id_)
+
+        return fastjson.loads(row[0])
+
+    def get(self, id_, default=None):
+        try:
+            return self[id_]
+        except KeyError:
+            return default
+
+    def __setitem__(self, id_, page):
+        # an existing page keeps its position, as with a dict
+        self.conn.execute(
+            "INSERT INTO pages (id, data) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+            (id_, fastjson.dumps(page)),
+        )
+
+    def __delitem__(self, id_):
+        cursor = self.conn.execute("DELETE FROM pages WHERE id = ?", (id_,))
+        if not cursor.rowcount:
+            raise KeyError(id_)
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        for row in self.conn.execute("SELECT id FROM pages ORDER BY seq"):
+            yield row[0]
+
+    def values(self):
+        for row in self.conn.execute("SELECT data FROM pages ORDER BY seq"):
+            yield fastjson.loads(row[0])
+
+    def items(self):
+        for id_, data in self.conn.execute("SELECT id, data FROM pages ORDER BY seq"):
+            yield id_, fastjson.loads(data)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,170 @@
+import math, hashlib
+from array import array
+from bisect import bisect_left
+
+"""
+Referrer Sets for Page Detection
+"""
+
+REFERRER_MODES = ("exact", "hashed", "bloom")
+
+# expected number of distinct referrers, used to size a bloom filter
+DEFAULT_BLOOM_CAPACITY = 10000000
+
+DEFAULT_BLOOM_FP_RATE = 0.001
+
+
+def fingerprint(url, size=8):
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=size).digest()
+
+
+def make_referrer_set(mode=None, capacity=None, fp_rate=None):
+    """Create the set of referrers used to filter detected pages
+    :param mode: exact (default), hashed or bloom
+    :returns: a set-like object supporting add, update and in
+    """
+    if not mode or mode == "exact":
+        return set()
+
+    if mode == "hashed":
+        return HashedReferrerSet()
+
+    if mode == "bloom":
+        return BloomReferrerSet(capacity, fp_rate)
+
+    raise ValueError("Unknown referrers mode: " + mode)
+
+
+def merge_unique(hashes, new_hashes):
+    """Merge sorted, unique new_hashes into the sorted array hashes, the runs
+    of hashes between new values are copied as array slices
+    :returns: sorted array of the hashes in either, without duplicates
+    :rtype: array
+    """
+    merged = array("Q")
+    i = 0
+    for value in new_hashes:
+        j = bisect_left(hashes, value, i)
+        merged.extend(hashes[i:j])
+        if j < len(hashes) and hashes[j] == value:
+            j += 1
+        merged.append(value)
+        i = j
+
+    merged.extend(hashes[i:])
+    return merged
+
+
+# ============================================================================
+class HashedReferrerSet:
+    """Stores a 64-bit hash of each referrer in a sorted array, about 8 bytes
+    per referrer instead of the full url. Hash collisions are possible but
+    very unlikely
+    """
+
+    def __init__(self):
+        self.hashes = array("Q")
+        self.num_sorted = 0
+        self.last = None
+
+    def add(self, url):
+        # consecutive records often share a referrer
+        if url == self.last:
+            return
+
+        self.last = url
+        self.hashes.append(int.from_bytes(fingerprint(url), "big"))
+
+        if len(self.hashes) >= max(self.num_sorted * 2, 1024):
+            self.compact()
+
+    def update(self, other):
+        if isinstance(other, HashedReferrerSet):
+            self.hashes.extend(other.hashes)
+            self.compact()
+        else:
+            for url in other:
+                self.add(url)
+
+    def compact(self):
+        """Sort and remove duplicate hashes. Only the hashes added since the
+        last compaction are sorted, then merged with the sorted prefix
+        """
+        tail = sorted(set(self.hashes[self.num_sorted :]))
+        if self.num_sorted:
+            self.hashes = merge_unique(self.hashes[: self.num_sorted], tail)
+        else:
+            self.hashes = array("Q", tail)
+
+        self.num_sorted = len(self.hashes)
+
+    def __contains__(self, url):
+        if len(self.hashes) != self.num_sorted:
+            self.compact()
+
+        value = int.from_bytes(fingerprint(url), "big")
+        i = bisect_left(self.hashes, value)
+        return i < len(self.hashes) and self.hashes[i] == value
+
+    def __len__(self):
+        if len(self.hashes) != self.num_sorted:
+            self.compact()
+
+        return len(self.hashes)
+
+
+# ============================================================================
+class BloomReferrerSet:
+    """Bloom filter of referrers, sized for capacity referrers at the given
+    false positive rate. A false positive keeps a page which has no referrer
+    """
+
+    def __init__(self, capacity=None, fp_rate=None):
+        self.capacity = capacity or DEFAULT_BLOOM_CAPACITY
+        self.fp_rate = fp_rate or DEFAULT_BLOOM_FP_RATE
+
+        if not 0 < self.fp_rate < 1:
+            raise ValueError("Bloom filter false positive rate must be between 0 and 1")
+
+        self.num_bits = max(
+            int(-self.capacity * math.log(self.fp_rate) / (math.log(2) ** 2)), 8
+        )
+        self.num_hashes = max(
+            int(round(self.num_bits / self.capacity * math.log(2))), 1
+        )
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.last = None
+
+    def positions(self, url):
+        # double hashing from one 128-bit digest
+        digest = fingerprint(url, 16)
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, url):
+        if url == self.last:
+            return
+
+        self.last = url
+        for pos in self.positions(url):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def update(self, other):
+        if isinstance(other, BloomReferrerSet):
+            if (other.num_bits, other.num_hashes) != (self.num_bits, self.num_hashes):
+                raise ValueError("Can't merge bloom filters of different sizes")
+
+            merged = int.from_bytes(self.bits, "big") | int.from_bytes(
+                other.bits, "big"
+            )
+            self.bits = bytearray(merged.to_bytes(len(self.bits), "big"))
+        else:
+            for url in other:
+                self.add(url)
+
+    def __contains__(self, url):
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(url)
+        )
@@ -0,0 +1,208 @@
+import io
+import socket
+import http.client
+from urllib.parse import urlsplit, urljoin
+
+"""
+Read-only access to a remote WACZ with HTTP range requests
+"""
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+MAX_REDIRECTS = 5
+
+# seconds to wait to connect or for data, before giving up on the server
+DEFAULT_TIMEOUT = 60
+
+
+def is_url(filename):
+    return filename.startswith(("http://", "https://"))
+
+
+# ============================================================================
+class RangeReaderError(Exception):
+    pass
+
+
+# ============================================================================
+class RangeReader(io.RawIOBase):
+    """Seekable, read-only file over HTTP, each read is served from a block
+    fetched with a range request, so a ZipFile can read the central directory
+    and stream each member without downloading the whole file.
+    All requests are sent over one keep-alive connection, a reader is not
+    thread-safe, each thread should use its own reader
+    """
+
+    def __init__(
+        self, url, block_size=DEFAULT_BLOCK_SIZE, size=None, timeout=DEFAULT_TIMEOUT
+    ):
+        self.url = url
+        self.block_size = block_size
+        self.timeout = timeout
+        self.pos = 0
+        self.block = b""
+        self.block_start = 0
+        self.conn = None
+
+        self.num_requests = 0
+        self.bytes_fetched = 0
+
+        # the size is found with the first range request, unless already known
+        self.size = size if size is not None else self.fetch_size()
+
+    def get_connection(self):
+        if not self.conn:
+            parts = urlsplit(self.url)
+            if parts.scheme == "https":
+                self.conn = http.client.HTTPSConnection(
+                    parts.netloc, timeout=self.timeout
+                )
+            else:
+                self.conn = http.client.HTTPConnection(
+                    parts.netloc, timeout=self.timeout
+                )
+
+        return self.conn
+
+    def request_range(self, start, end):
+        """Fetch bytes start to end, inclusive
+        :returns: total size of the file and the bytes fetched
+        :rtype: tuple
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(self.url)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+
+            headers = {"Range": "bytes={0}-{1}".format(start, end)}
+            try:
+                response = self.send_request(path, headers)
+            except (
+                http.client.RemoteDisconnected,
+                ConnectionResetError,
+                BrokenPipeError,
+            ):
+                # the server closed the keep-alive connection, retry once
+                # on a new connection
+                self.close_connection()
+                response = self.send_request(path, headers)
+
+            if response.status not in (301, 302, 303, 307, 308):
+                break
+
+            # the body is not read, so the connection can't be reused, and
+            # a new one is opened, also as the redirect may be to another host
+            self.url = urljoin(self.url, response.getheader("Location"))
+            self.close_connection(response)
+
+        self.num_requests += 1
+
+        if response.status != 206:
+            # the whole file may follow, it is not read
+            self.close_connection(response)
+            raise RangeReaderError(
+                "Range requests not supported for {0}, status {1}".format(
+                    self.url, response.status
+                )
+            )
+
+        try:
+            data = response.read()
+        except socket.timeout:
+            self.close_connection(response)
+            raise RangeReaderError(
+                "Timed out reading {0} after {1}s".format(self.url, self.timeout)
+            )
+
+        self.bytes_fetched += len(data)
+
+        content_range = response.getheader("Content-Range", "")
+        try:
+            size = int(content_range.rsplit("/", 1)[1])
+        except (IndexError, ValueError):
+            raise RangeReaderError(
+                "Invalid Content-Range for {0}: {1}".format(self.url, content_range)
+            )
+
+        return size, data
+
+    def send_request(self, path, headers):
+        """Send a GET request on the keep-alive connection
+        :returns: the response, with the body not yet read
+        :rtype: http.client.HTTPResponse
+        """
+        conn = self.get_connection()
+        try:
+            conn.request("GET", path, headers=headers)
+            return conn.getresponse()
+        except socket.timeout:
+            self.close_connection()
+            raise RangeReaderError(
+                "Timed out requesting {0} after {1}s".format(self.url, self.timeout)
+            )
+
+    def close_connection(self, response=None):
+        if response:
+            response.close()
+
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def fetch_size(self):
+        size, _ = self.request_range(0, 0)
+        return size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = self.size + offset
+        else:
+            raise ValueError("Invalid whence: {0}".format(whence))
+
+        if self.pos < 0:
+            raise ValueError("Negative seek position")
+
+        return self.pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.pos
+
+        size = min(size, self.size - self.pos)
+        if size <= 0:
+            return b""
+
+        offset = self.pos - self.block_start
+        if offset < 0 or offset + size > len(self.block):
+            # fetch at least a block from the current position
+            end = min(self.pos + max(size, self.block_size), self.size) - 1
+            _, self.block = self.request_range(self.pos, end)
+            self.block_start = self.pos
+            offset = 0
+
+        data = self.block[offset : offset + size]
+        self.pos += len(data)
+        return data
+
+    def readinto(self, buff):
+        data = self.read(len(buff))
+        buff[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.close_connection()
+        super().close()
@@ -0,0 +1,178 @@
+import os, shutil, sqlite3, tempfile, time
+
+"""
+Extracted Page Text Cache
+"""
+
+TEXT_CACHE_DB = "text-cache.sqlite"
+
+# default max size of cached text, least recently used entries are evicted over this
+DEFAULT_TEXT_CACHE_SIZE = 1024 * 1024 * 1024
+
+# number of new or read entries kept before they are written in one transaction
+TEXT_CACHE_BATCH_SIZE = 100
+
+
+def normalize_digest(digest):
+    """Normalize the algorithm name of a payload digest, eg. sha-256:... and
+    sha256:... are the same digest
+    :returns: the digest, or None if not set
+    :rtype: str or None
+    """
+    if not digest:
+        return None
+
+    algo, sep, value = digest.partition(":")
+    if not sep:
+        return digest
+
+    return algo.lower().replace("-", "") + ":" + value
+
+
+# ============================================================================
+class TextCache:
+    """Caches the text and title extracted from html payloads, keyed by
+    WARC-Payload-Digest. Stored in SQLite in cache_dir to be reused across
+    runs, or in a temp dir for a single run if no cache_dir is set, so that
+    extracted text is not kept in memory. The cache_dir may be shared by
+    several indexing processes.
+    New entries and access times are written in batches, and on close
+    """
+
+    def __init__(self, cache_dir=None, max_size=None):
+        self.max_size = max_size or DEFAULT_TEXT_CACHE_SIZE
+        self.hits = 0
+        self.misses = 0
+        self.temp_dir = None
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        else:
+            cache_dir = self.temp_dir = tempfile.mkdtemp(
+                prefix="wacz-text-cache-", dir=tempfile.gettempdir()
+            )
+
+        self.cache_dir = cache_dir
+
+        # new entries as (text, title, accessed), and access times of entries read
+        self.pending = {}
+        self.accessed = {}
+
+        self.conn = sqlite3.connect(os.path.join(cache_dir, TEXT_CACHE_DB), timeout=60)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        if self.temp_dir:
+            # only used by this run, no need to sync to disk
+            self.conn.execute("PRAGMA synchronous = OFF")
+        else:
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS text_cache "
+            "(digest TEXT PRIMARY KEY, text TEXT, title TEXT, size INTEGER, accessed REAL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS text_cache_accessed ON text_cache (accessed)"
+        )
+        self.conn.commit()
+
+    def get(self, digest):
+        """Get cached text for a payload digest
+        :returns: (text, title) or None if not cached
+        :rtype: tuple or None
+        """
+        digest = normalize_digest(digest)
+        if not digest:
+            return None
+
+        if digest in self.pending:
+            self.hits += 1
+            text, title, _ = self.pending[digest]
+            self.pending[digest] = (text, title, time.time())
+            return text, title
+
+        row = self.conn.execute(
+            "SELECT text, title FROM text_cache WHERE digest = ?", (digest,)
+        ).fetchone()
+
+        if not row:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.accessed[digest] = time.time()
+        if len(self.accessed) >= TEXT_CACHE_BATCH_SIZE:
+            self.flush()
+
+        return row[0], row[1]
+
+    def put(self, digest, text_data):
+        """Cache the result of text extraction, a failed extraction is cached
+        as empty text so that it is not retried
+        """
+        digest = normalize_digest(digest)
+        if not digest:
+            return
+
+        text, title = text_data or ("", "")
+        self.pending[digest] = (text or "", title or "", time.time())
+        if len(self.pending) >= TEXT_CACHE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write the new entries and access times in one transaction"""
+        if not self.pending and not self.accessed:
+            return
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO text_cache VALUES (?, ?, ?, ?, ?)",
+                (
+                    (digest, text, title, len(text) + len(title), accessed)
+                    for digest, (text, title, accessed) in self.pending.items()
+                ),
+            )
+            self.conn.executemany(
+                "UPDATE text_cache SET accessed = ? WHERE digest = ?",
+                ((accessed, digest) for digest, accessed in self.accessed.items()),
+            )
+
+        self.pending.clear()
+        self.accessed.clear()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_size
+        :returns: number of entries removed
+        :rtype: int
+        """
+        self.flush()
+
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM text_cache"
+        ).fetchone()[0]
+
+        if total <= self.max_size:
+            return 0
+
+        to_delete = []
+        cursor = self.conn.execute(
+            "SELECT digest, size FROM text_cache ORDER BY accessed ASC"
+        )
+        for digest, size in cursor:
+            if total <= self.max_size:
+                break
+
+            to_delete.append((digest,))
+            total -= size
+
+        with self.conn:
+            self.conn.executemany("DELETE FROM text_cache WHERE digest = ?", to_delete)
+
+        return len(to_delete)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+        if self.temp_dir:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
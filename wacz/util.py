@@ -1,12 +1,15 @@
-import hashlib, datetime, json, os
-from warcio.timeutils import iso_date_to_timestamp
-import pkg_resources
+import hashlib, datetime, os, zlib, zipfile
+from contextlib import contextmanager
+from importlib import metadata
+from wacz import fastjson
 
 WACZ_VERSION = "1.1.1"
 
 
 BUFF_SIZE = 1024 * 64
 
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
 
 def check_http_and_https(url, ts, pages_dict):
     """Checks for http and https versions of the passed url
@@ -15,6 +18,12 @@ def check_http_and_https(url, ts, pages_dict):
     :returns: True or False depending on if a match was found
     :rtype: boolean
     """
+    if not pages_dict:
+        return ""
+
+    if isinstance(pages_dict, PassedPagesDict):
+        return pages_dict.match(url, ts)
+
     parts = url.split(":", 1)
     if len(parts) < 2:
         return ""
@@ -36,7 +45,7 @@ def check_http_and_https(url, ts, pages_dict):
 
 def get_py_wacz_version():
     """Get version of the py-wacz package"""
-    return pkg_resources.get_distribution("wacz").version
+    return metadata.version("wacz")
 
 
 def hash_stream(hash_type, stream):
@@ -58,6 +67,203 @@ def hash_stream(hash_type, stream):
     return size, hash_type + ":" + hasher.hexdigest()
 
 
+class HashingWriter:
+    """Wraps a writable stream, hashing and counting bytes as they are written"""
+
+    def __init__(self, out, hash_type):
+        self.out = out
+        self.hash_type = hash_type
+        self.hasher = hashlib.new(hash_type)
+        self.size = 0
+
+    def write(self, buff):
+        self.hasher.update(buff)
+        self.size += len(buff)
+        return self.out.write(buff)
+
+    def flush(self):
+        self.out.flush()
+
+    def get_hash(self):
+        return self.hash_type + ":" + self.hasher.hexdigest()
+
+
+class DigestingReader:
+    """Wraps a readable stream, computing the hash, size and crc32 of the data
+    as it is read through in order. Data re-read after seeking back is not
+    hashed again, a seek past unread data makes the digest unavailable.
+    """
+
+    def __init__(self, stream, hash_type):
+        self.stream = stream
+        self.hash_type = hash_type
+        self.hasher = hashlib.new(hash_type)
+        self.crc = 0
+        self.size = 0
+        self.pos = 0
+        self.at_eof = False
+        self.skipped = False
+
+    def read(self, size=-1):
+        buff = self.stream.read(size)
+        self._update(buff)
+        return buff
+
+    def readline(self, size=-1):
+        buff = self.stream.readline(size)
+        self._update(buff)
+        return buff
+
+    def _update(self, buff):
+        end = self.pos + len(buff)
+        if not buff:
+            if self.pos == self.size:
+                self.at_eof = True
+        elif self.pos > self.size:
+            self.skipped = True
+        elif end > self.size:
+            new_buff = memoryview(buff)[self.size - self.pos :]
+            self.hasher.update(new_buff)
+            self.crc = zlib.crc32(new_buff, self.crc)
+            self.size = end
+
+        self.pos = end
+
+    def seek(self, offset, whence=0):
+        self.pos = self.stream.seek(offset, whence)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def get_digest(self):
+        """Returns (size, hash, crc32) if the whole stream was read, otherwise None"""
+        if not self.at_eof or self.skipped:
+            return None
+
+        return self.size, self.hash_type + ":" + self.hasher.hexdigest(), self.crc
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+@contextmanager
+def open_hashed_entry(wacz, zip_info, hash_type, resource_hashes):
+    """Opens a new zip entry for writing, recording its size and hash
+    in resource_hashes once written
+    """
+    with wacz.open(zip_info, "w") as fh:
+        out = HashingWriter(fh, hash_type)
+        yield out
+
+    resource_hashes[zip_info.filename] = (out.size, out.get_hash())
+
+
+def write_stored_entry(wacz, zip_info, filename, size, crc):
+    """Writes a file as a stored zip entry with a known size and crc32,
+    copying the data directly between file descriptors in the kernel.
+    The local header is written with the final size and crc32, so the
+    result is the same as writing the entry with ZipFile.open()
+    :returns: True if written, False if the direct copy is not possible
+    :rtype: boolean
+    """
+    if (
+        not hasattr(os, "pread")
+        or not wacz._seekable
+        or wacz._writing
+        or not hasattr(wacz.fp, "fileno")
+        or os.path.getsize(filename) != size
+    ):
+        return False
+
+    try:
+        out_fd = wacz.fp.fileno()
+    except (OSError, ValueError):
+        return False
+
+    zip_info.compress_type = zipfile.ZIP_STORED
+    zip_info.flag_bits = 0x00
+    if not zip_info.external_attr:
+        zip_info.external_attr = 0o600 << 16
+
+    zip_info.file_size = size
+    zip_info.compress_size = size
+    zip_info.CRC = crc
+
+    # same margin as ZipFile.open() for writing, so the headers are the same
+    zip64 = size * 1.05 > zipfile.ZIP64_LIMIT
+    if zip64 and not wacz._allowZip64:
+        raise zipfile.LargeZipFile("Filesize would require ZIP64 extensions")
+
+    wacz.fp.seek(wacz.start_dir)
+    zip_info.header_offset = wacz.fp.tell()
+
+    wacz._writecheck(zip_info)
+    wacz._didModify = True
+
+    wacz.fp.write(zip_info.FileHeader(zip64))
+    wacz.fp.flush()
+
+    data_offset = wacz.fp.tell()
+    with open(filename, "rb") as in_fh:
+        copy_fd_range(in_fh.fileno(), out_fd, 0, data_offset, size)
+
+    wacz.start_dir = wacz.fp.seek(data_offset + size)
+    wacz.filelist.append(zip_info)
+    wacz.NameToInfo[zip_info.filename] = zip_info
+    return True
+
+
+def remove_zip_entry(wacz, filename):
+    """Removes an entry from the central directory of a zip opened for
+    appending. The entry data is left in place, but is no longer referenced
+    """
+    zip_info = wacz.NameToInfo.pop(filename, None)
+    if zip_info:
+        wacz.filelist.remove(zip_info)
+        wacz._didModify = True
+
+
+def copy_fd_range(in_fd, out_fd, in_offset, out_offset, count):
+    """Copies count bytes between file descriptors at the given offsets, using
+    copy_file_range() or sendfile() if available, falling back to pread/pwrite
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            while count > 0:
+                copied = os.copy_file_range(in_fd, out_fd, count, in_offset, out_offset)
+                if not copied:
+                    break
+                in_offset += copied
+                out_offset += copied
+                count -= copied
+        except OSError:
+            # eg. not supported across filesystems on older kernels
+            pass
+
+    if count > 0 and hasattr(os, "sendfile"):
+        try:
+            os.lseek(out_fd, out_offset, os.SEEK_SET)
+            while count > 0:
+                copied = os.sendfile(out_fd, in_fd, in_offset, count)
+                if not copied:
+                    break
+                in_offset += copied
+                out_offset += copied
+                count -= copied
+        except OSError:
+            pass
+
+    while count > 0:
+        buff = os.pread(in_fd, min(BUFF_SIZE, count), in_offset)
+        if not buff:
+            raise IOError("Unexpected end of file, {0} bytes remaining".format(count))
+        written = os.pwrite(out_fd, buff, out_offset)
+        in_offset += written
+        out_offset += written
+        count -= written
+
+
 def hash_file(type_, filename):
     with open(filename, "rb") as fh:
         size_, hash_ = hash_stream(type_, fh)
@@ -65,20 +271,99 @@ def hash_file(type_, filename):
     return hash_
 
 
+class PassedPagesDict(dict):
+    """Dict of passed pages by url or ts/url key, which also indexes the keys
+    by scheme-less url and timestamp, so that a record is matched against
+    the http and https keys with a single lookup
+    """
+
+    def __init__(self, items=()):
+        super().__init__()
+        # (ts or "", url without scheme) -> {scheme: key}
+        self.index = {}
+        # header line of the pages file, if any
+        self.header = {}
+        for key, value in items:
+            self[key] = value
+
+    @staticmethod
+    def parse_key(key):
+        ts, sep, url = key.partition("/")
+        if not sep or not ts.isdigit():
+            ts, url = "", key
+
+        scheme, sep, body = url.partition(":")
+        if not sep or scheme not in ("http", "https"):
+            return None
+
+        return (ts, body), scheme
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        parsed = self.parse_key(key)
+        if parsed:
+            self.index.setdefault(parsed[0], {})[parsed[1]] = key
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        parsed = self.parse_key(key)
+        if parsed:
+            schemes = self.index[parsed[0]]
+            del schemes[parsed[1]]
+            if not schemes:
+                del self.index[parsed[0]]
+
+    def pop(self, key, *args):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+
+        return super().pop(key, *args)
+
+    def __reduce__(self):
+        return (self.__class__, (list(self.items()),))
+
+    def match(self, url, ts):
+        """Find the key matching the url, in the same order as check_http_and_https
+        :returns: matching key or empty string
+        :rtype: str
+        """
+        if not self.index:
+            return ""
+
+        parts = url.split(":", 1)
+        if len(parts) < 2:
+            return ""
+
+        for check_ts in ("", ts):
+            schemes = self.index.get((check_ts, parts[1]))
+            if schemes:
+                return schemes.get("http") or schemes["https"]
+
+        return ""
+
+
 def construct_passed_pages_dict(passed_pages_list):
-    """Creates a dictionary of the passed pages with the url as the key or ts/url if ts is present and the title and text as the values if they have been passed"""
-    passed_pages_dict = {}
+    """Parses each line of passed_pages_list once, which may be a stream of lines.
+    Creates a dictionary of the passed pages with the url as the key or ts/url if ts is present and the title and text as the values if they have been passed
+    """
+    passed_pages_dict = PassedPagesDict()
 
-    for page_data in passed_pages_list:
+    for i, page_data in enumerate(passed_pages_list):
         # Skip invalid page data
         try:
-            page_dict = json.loads(page_data)
+            page_dict = fastjson.loads(page_data)
         except:
             print("Warning: Skipping invalid page {0}".format(page_data))
             continue
 
-        # Skip the file's header if it's been set
-        if "format" not in page_dict:
+        # Keep the file's header, if set on the first line
+        if "format" in page_dict:
+            if i == 0:
+                passed_pages_dict.header = page_dict
+
+        else:
             url = page_dict.get("url", "")
 
             # Set the default key as url, but without hashtag, as will match pages
@@ -87,6 +372,8 @@ def construct_passed_pages_dict(passed_pages_list):
 
             # If timestamp is present overwrite the key to be 'ts/url'
             if "ts" in page_dict:
+                from warcio.timeutils import iso_date_to_timestamp
+
                 key = iso_date_to_timestamp(page_dict.pop("ts")) + "/" + url
 
             # Add the key to the dictionary with remaining data
@@ -95,6 +382,31 @@ def construct_passed_pages_dict(passed_pages_list):
     return passed_pages_dict
 
 
+def parse_size(size):
+    """Parses a size with an optional K, M, G or T suffix, eg. 512M
+    :returns: size in bytes
+    :rtype: int
+    """
+    value = size.strip().upper()
+    if value.endswith("B"):
+        value = value[:-1]
+
+    unit = ""
+    if value and value[-1] in SIZE_UNITS:
+        unit = value[-1]
+        value = value[:-1]
+
+    try:
+        result = int(float(value) * SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError("Invalid size: {0}".format(size))
+
+    if result <= 0:
+        raise ValueError("Invalid size: {0}".format(size))
+
+    return result
+
+
 def now():
     """Returns the current time"""
     return tuple(datetime.datetime.utcnow().timetuple()[:6])
@@ -103,7 +415,7 @@ def now():
 def validateJSON(jsonData):
     """Attempts to validate a string as json"""
     try:
-        json.loads(jsonData)
+        fastjson.loads(jsonData)
     except ValueError as err:
         return False
     return True
@@ -120,7 +432,7 @@ def validate_pages_jsonl_file(json_file_path):
     with open(json_file_path, "r") as jsonl_file:
         for line in jsonl_file:
             try:
-                data = json.loads(line)
+                data = fastjson.loads(line)
                 if line_index == 0:
                     data["format"]
                     data["id"]
@@ -128,7 +440,7 @@ def validate_pages_jsonl_file(json_file_path):
                     data["url"]
                     data["ts"]
                 line_index += 1
-            except json.JSONDecodeError:
+            except fastjson.JSONDecodeError:
                 print(f"File {filename} is invalid JSONL")
                 return False
             except KeyError:
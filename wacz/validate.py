@@ -1,64 +1,111 @@
-import tempfile, os, zipfile, json, pathlib, pkg_resources, gzip
-from frictionless import validate
-from wacz.util import hash_stream, now
-from wacz.waczindexer import WACZIndexer
-from io import BytesIO, StringIO, TextIOWrapper
-import glob
+import os, zipfile, json, threading
+from wacz.util import hash_stream
+from wacz.remote import RangeReader, is_url
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import requests
 
 OUTDATED_WACZ = "0.1.0"
 
 
 class Validation(object):
-    def __init__(self, filename, verify_auth=False, verifier_url=None):
-        self.dir = tempfile.TemporaryDirectory()
+    def __init__(self, filename, verify_auth=False, verifier_url=None, workers=1):
+        # members are read directly from the zip, nothing is extracted
         self.wacz = filename
-        with zipfile.ZipFile(filename, "r") as zip_ref:
-            zip_ref.extractall(self.dir.name)
-            zip_ref.close()
+        if is_url(filename):
+            # a remote wacz is read with range requests
+            self.reader = RangeReader(filename)
+            self.size = self.reader.size
+            self.zip = zipfile.ZipFile(self.reader, "r")
+        else:
+            self.reader = None
+            self.size = os.path.getsize(filename)
+            self.zip = zipfile.ZipFile(filename, "r")
+
+        self.names = set(self.zip.namelist())
         self.detect_version()
         self.detect_hash_type()
 
         self.verify_auth = verify_auth
         self.verifier_url = verifier_url
+        # hashlib releases the GIL while hashing, so files are hashed in threads
+        self.workers = workers
+        self.local = threading.local()
+        self.thread_zips = []
+
+    def get_zip(self):
+        """The zip to read from in the current thread. A remote zip is opened
+        again in each worker thread, so each fetches its ranges in parallel
+        over its own connection
+        """
+        if not self.reader or self.workers <= 1:
+            return self.zip
+
+        zip_ = getattr(self.local, "zip", None)
+        if not zip_:
+            reader = RangeReader(self.reader.url, size=self.size)
+            zip_ = zipfile.ZipFile(reader, "r")
+            self.local.zip = zip_
+            self.thread_zips.append((zip_, reader))
+
+        return zip_
+
+    def fetch_stats(self):
+        """Number of range requests and bytes fetched for a remote wacz
+        :rtype: dict
+        """
+        readers = [self.reader] + [reader for _, reader in self.thread_zips]
+        return {
+            "http_requests": sum(reader.num_requests for reader in readers),
+            "bytes_fetched": sum(reader.bytes_fetched for reader in readers),
+        }
+
+    def close(self):
+        for zip_, reader in self.thread_zips:
+            zip_.close()
+            reader.close()
+
+        self.thread_zips = []
+        self.zip.close()
+        if self.reader:
+            self.reader.close()
+
+    def read_json(self, name):
+        with self.zip.open(name) as fh:
+            return json.loads(fh.read())
 
     def check_required_contents(self):
         """Checks the general component of the wacz and notifies users whats missing"""
-        if os.path.exists(os.path.join(self.dir.name, "datapackage.json")) is False:
+        if "datapackage.json" not in self.names:
             print("Datapackage is missing from your wacz file")
             return 1
-        if (
-            glob.glob(os.path.join(self.dir.name, "archive/*.warc")) == False
-            and glob.glob(os.path.join(self.dir.name, "archive/*.warc.gz")) == False
+        if not any(
+            name.startswith("archive/") and name.endswith((".warc", ".warc.gz"))
+            for name in self.names
         ):
             print(
                 "A warc file is missing from your archive folder you must have a .warc or .warc.gz file in your archive folder"
             )
             return 1
-        if (
-            glob.glob(os.path.join(self.dir.name, "indexes/index.cdx.gz")) == False
-            and glob.glob(os.path.join(self.dir.name, "indexes/index.cdx.gz")) == False
-            and glob.glob(os.path.join(self.dir.name, "indexes/index.idx")) == False
-        ):
-            print(
-                "An index file is missing from your indexes folder you must have an index.cdx.gz, index,cdx or index.idx in your index folder"
-            )
-            return 1
-        if glob.glob(os.path.join(self.dir.name, "pages/pages.jsonl")) == False:
+        if not self.names & {
+            "indexes/index.cdx.gz",
+            "indexes/index.cdx",
+            "indexes/index.idx",
+        }:
             print(
                 "An index file is missing from your indexes folder you must have an index.cdx.gz, index,cdx or index.idx in your index folder"
             )
             return 1
+        if "pages/pages.jsonl" not in self.names:
+            # a wacz created from WARCs without any pages has no page list
+            print("Note: No pages.jsonl found, the WACZ has no list of pages")
 
         return 0
 
     def detect_hash_type(self):
         self.hash_type = None
         # we know the datapackage exists at this point because we're running it after the version check
-        self.datapackage_path = os.path.join(self.dir.name, "datapackage.json")
-        self.datapackage = json.loads(open(self.datapackage_path, "rb").read())
+        self.datapackage = self.read_json("datapackage.json")
         try:
             self.hash_type = self.datapackage["resources"][0]["hash"].split(":")[0]
             return 0
@@ -70,10 +117,8 @@ class Validation(object):
 
     def detect_version(self):
         self.version = None
-        if os.path.exists(os.path.join(self.dir.name, "datapackage.json")):
-            self.data_folder = os.listdir(self.dir.name)
-            self.datapackage_path = os.path.join(self.dir.name, "datapackage.json")
-            self.datapackage = json.loads(open(self.datapackage_path, "rb").read())
+        if "datapackage.json" in self.names:
+            self.datapackage = self.read_json("datapackage.json")
 
             try:
                 self.version = self.datapackage["wacz_version"]
@@ -82,9 +127,8 @@ class Validation(object):
                 return
 
             print("\nVersion detected as %s" % self.version)
-        elif os.path.exists(os.path.join(self.dir.name, "webarchive.yaml")):
+        elif "webarchive.yaml" in self.names:
             self.version = OUTDATED_WACZ
-            self.webarchive_yaml = os.path.join(self.dir.name, "webarchive.yaml")
             print(
                 "\nWACZ version detected as 0.1.0. This is an outdated version of WACZ."
             )
@@ -92,126 +136,110 @@ class Validation(object):
             print("\nVersion not able to be detected, invalid wacz file")
 
     def frictionless_validate(self):
-        """Uses the frictionless data package to validate the datapackage.json file"""
-        if validate(self.datapackage_path).valid == True:
+        """Uses the frictionless data package to validate the datapackage.json descriptor,
+        the resources themselves are checked against it by check_file_hashes"""
+        from frictionless import Package
+
+        report = Package.validate_descriptor(self.datapackage)
+        if report.valid == True:
             return True
         else:
             print(
                 "\nFrictionless has detected that this is an invalid package with errors %s"
-                % validate(self.datapackage_path).errors
+                % report.flatten(["type", "note"])
             )
             return False
 
+    def iter_resource_names(self):
+        """Names of the files in the wacz, other than the datapackage files"""
+        for name in self.zip.namelist():
+            if name.endswith("/"):
+                continue
+            filename = os.path.basename(name)
+            if filename != "datapackage.json" and filename != "datapackage-digest.json":
+                yield name
+
     def check_file_paths(self):
-        """Uses the datapackage to check that all the files listed exist in the data folder or that the wacz contains a webarchive.yml file"""
+        """Uses the datapackage to check that all the files listed exist in the data folder and that all the files are listed,
+        or that the wacz contains a webarchive.yml file"""
         if self.version != OUTDATED_WACZ:
             package_files = [item["path"] for item in self.datapackage["resources"]]
-            for filepath in pathlib.Path(self.dir.name).glob("**/*.*"):
-                filename = os.path.basename(filepath)
-                if (
-                    filename != "datapackage.json"
-                    and filename != "datapackage-digest.json"
-                ):
-                    file = str(filepath).split("/")[-2:]
-                    file = "/".join(file)
-                    if file not in package_files:
-                        print("file %s is not listed in the datapackage" % file)
-                        return False
+            for name in self.iter_resource_names():
+                if name not in package_files:
+                    print("file %s is not listed in the datapackage" % name)
+                    return False
+
+            for path in package_files:
+                if path not in self.names:
+                    print("file %s listed in the datapackage is missing" % path)
+                    return False
         return True
 
     def check_compression(self):
         """WARCs and compressed cdx.gz should be in ZIP with 'store' compression (not deflate) Indexes and page list can be compressed"""
-        wacz = zipfile.ZipInfo(self.wacz)
-        if wacz.compress_type != 0:
-            return False
-
-        if os.path.exists(os.path.join(self.dir.name, "indexes/index.cdx.gz")):
-            cdx = zipfile.ZipInfo(os.path.join(self.dir.name, "indexes/index.cdx.gz"))
-            if cdx.compress_type != 0:
-                return False
-
-        archive_folder = os.listdir(os.path.join(self.dir.name, "archive"))
-        for item in archive_folder:
-            if ".warc" not in item and zf.getinfo(item).compress_type != 0:
-                return False
+        for info in self.zip.infolist():
+            if info.filename.startswith("archive/") or info.filename.endswith(
+                ".cdx.gz"
+            ):
+                if info.compress_type != zipfile.ZIP_STORED:
+                    return False
         return True
 
     def check_indexes(self):
-        """Indexing existing WARC which should match the index in the wacz"""
-        if os.path.exists(os.path.join(self.dir.name, "indexes/index.cdx.gz")):
-            for resource in self.datapackage["resources"]:
-                if resource["path"] == "indexes/index.cdx.gz":
-                    cdx = resource["hash"]
-        else:
+        """The compressed index in the wacz should match its hash in the datapackage"""
+        if "indexes/index.cdx.gz" not in self.names:
             return False
 
-        archive_folder = os.listdir(os.path.join(self.dir.name, "archive"))
-        for item in archive_folder:
-            if ".warc" in item:
-                warc = item
-        wacz_file = tempfile.NamedTemporaryFile(delete=False)
-        wacz = zipfile.ZipFile(wacz_file.name, "w")
-        data_file = zipfile.ZipInfo("indexes/index.cdx.gz", now())
-        index_buff = BytesIO()
-        text_wrap = TextIOWrapper(index_buff, "utf-8", write_through=True)
-        wacz_indexer = None
-        with wacz.open(data_file, "w") as data:
-            wacz_indexer = WACZIndexer(
-                text_wrap,
-                {},
-                sort=True,
-                compress=data,
-                fields="referrer",
-                data_out_name="index.cdx.gz",
-                records="all",
-                main_url="",
-                detect_pages="",
-            )
+        cdx = None
+        for resource in self.datapackage["resources"]:
+            if resource["path"] == "indexes/index.cdx.gz":
+                cdx = resource["hash"]
 
-            wacz_indexer.process_all()
-        wacz.close()
-        dir = tempfile.TemporaryDirectory()
-        with zipfile.ZipFile(self.wacz, "r") as zip_ref:
-            zip_ref.extractall(dir.name)
-            zip_ref.close()
-
-        with open(os.path.join(dir.name, "indexes/index.cdx.gz"), "rb") as fd:
+        with self.zip.open("indexes/index.cdx.gz") as fd:
             size, hash_ = hash_stream(self.hash_type, fd)
-            gzip_fd = gzip.GzipFile(fileobj=fd)
 
         return cdx == hash_
 
+    def hash_file(self, path):
+        with self.get_zip().open(path) as fh:
+            return hash_stream(self.hash_type, fh)
+
     def check_file_hashes(self):
-        """Uses the datapackage to check that all the hashes of file in the data folder match those in the datapackage"""
-        for filepath in pathlib.Path(self.dir.name).glob("**/*.*"):
-            filename = os.path.basename(filepath)
-            if filename != "datapackage.json" and filename != "datapackage-digest.json":
-                with open(filepath, "rb") as fh:
-                    size, hash_ = hash_stream(self.hash_type, fh)
-
-                path = str(filepath).split("/")[-2:]
-                path = "/".join(path)
-                res = None
-                for item in self.datapackage["resources"]:
-                    if item["path"] == path:
-                        res = item
-                if res == None or (res["hash"] != hash_):
-                    print(
-                        "\nfile %s's hash does not match the hash listed in the datapackage"
-                        % path
-                    )
-                    return False
-        return True
+        """Uses the datapackage to check that all the hashes of file in the data folder match those in the datapackage,
+        reporting every file which does not match"""
+        resources = {item["path"]: item for item in self.datapackage["resources"]}
+        paths = list(self.iter_resource_names())
+
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                hashes = list(executor.map(self.hash_file, paths))
+        else:
+            hashes = [self.hash_file(path) for path in paths]
+
+        valid = True
+        for path, (size, hash_) in zip(paths, hashes):
+            res = resources.get(path)
+            if res == None or (res["hash"] != hash_):
+                print(
+                    "\nfile %s's hash does not match the hash listed in the datapackage"
+                    % path
+                )
+                valid = False
+            elif res.get("bytes", size) != size:
+                print(
+                    "\nfile %s's size does not match the size listed in the datapackage"
+                    % path
+                )
+                valid = False
+        return valid
 
     def check_data_package_hash_and_sig(self):
-        data_digest_filename = os.path.join(self.dir.name, "datapackage-digest.json")
-        if not os.path.exists(data_digest_filename):
+        if "datapackage-digest.json" not in self.names:
             return True
 
-        with open(data_digest_filename) as fh:
-            data_digest = json.loads(fh.read())
+        data_digest = self.read_json("datapackage-digest.json")
 
-        with open(os.path.join(self.dir.name, "datapackage.json"), "rb") as fh:
+        with self.zip.open("datapackage.json") as fh:
             size, hash_ = hash_stream(self.hash_type, fh)
 
         if hash_ != data_digest["hash"]:
@@ -234,6 +262,8 @@ class Validation(object):
                 return True
 
             if self.verifier_url:
+                import requests
+
                 res = requests.post(self.verifier_url, json=signed_data)
                 success = res.status_code == 200
                 msg = self.verifier_url
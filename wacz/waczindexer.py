@@ -1,12 +1,25 @@
-import json, shortuuid
+import shortuuid
 from urllib.parse import quote, urlsplit, urlunsplit
-import os, gzip, glob, zipfile, traceback
+import os, sys, gzip, glob, zipfile, traceback, tempfile, copy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
 from cdxj_indexer.main import CDXJIndexer
+from warcio.archiveiterator import ArchiveIterator
+from warcio.indexer import Indexer
+from warcio.utils import open_or_default
 from warcio.warcwriter import BufferWARCWriter
 from warcio.timeutils import iso_date_to_timestamp, timestamp_to_iso_date
-from boilerpy3 import extractors
+from wacz.indexwriter import SpillingSortWriter, ParallelCompressedWriter
+from wacz.indexwriter import DEFAULT_SORT_MEMORY, OVERSIZE_MODES
+from wacz.textcache import TextCache
+from wacz.pagestore import PageStore
+from wacz.referrers import make_referrer_set
+from wacz.metrics import Metrics, Timer, add_counts, add_span_counts
+from wacz import fastjson
 from wacz.util import (
+    DigestingReader,
     hash_stream,
+    open_hashed_entry,
     now,
     WACZ_VERSION,
     get_py_wacz_version,
@@ -15,10 +28,28 @@ from wacz.util import (
 
 import datetime
 import hashlib
-import requests
+import time
 
 HTML_MIME_TYPES = ("text/html", "application/xhtml", "application/xhtml+xml")
 
+# options that only apply to the merged output, not to per-input runs
+RUN_EXCLUDE_KWARGS = (
+    "compress",
+    "data_out_name",
+    "lines",
+    "sort",
+    "workers",
+    "text_workers",
+    "compress_threads",
+    "block_size",
+    "resource_hashes",
+    "sorted_runs",
+    "metrics",
+)
+
+# max number of pages waiting for text extraction, per text worker
+PENDING_TEXT_PER_WORKER = 8
+
 # Add warcinfo as a default record for indexing to simplify filtering logic
 CDXJIndexer.DEFAULT_RECORDS.append("warcinfo")
 
@@ -26,9 +57,55 @@ CDXJIndexer.DEFAULT_RECORDS.append("warcinfo")
 # ============================================================================
 class WACZIndexer(CDXJIndexer):
     def __init__(self, *args, **kwargs):
+        # options passed on to per-input indexers when indexing in parallel
+        self.run_kwargs = {
+            key: value for key, value in kwargs.items() if key not in RUN_EXCLUDE_KWARGS
+        }
+
+        # extra fields written to the index, besides the default fields
+        self.extra_fields = parse_index_fields(kwargs.get("fields"))
+
+        # the referrer is always needed to detect pages, but is only written
+        # to the index if it is one of the extra fields
+        self.hidden_fields = []
+        if kwargs.get("detect_pages") and kwargs.get("fields") is not None:
+            if "referrer" not in self.extra_fields:
+                self.hidden_fields.append("referrer")
+
+        if kwargs.get("fields") is not None:
+            kwargs["fields"] = ",".join(self.extra_fields + self.hidden_fields)
+
         super().__init__(*args, **kwargs)
-        self.pages = {}
-        self.extra_pages = {}
+
+        self.max_field_size = kwargs.pop("max_field_size", None)
+        self.oversize_fields = kwargs.pop("oversize_fields", None) or "truncate"
+        if self.oversize_fields not in OVERSIZE_MODES:
+            raise ValueError("Unknown oversize fields mode: " + self.oversize_fields)
+
+        # bytes taken by each field in the index lines written
+        self.field_sizes = {}
+
+        # bytes, records and time taken to index each input
+        self.input_stats = {}
+        # number of records indexed, by record type
+        self.record_counts = {}
+        # pages, bytes and time taken to extract text
+        self.text_stats = {}
+        # text extraction is profiled apart from indexing, when profiling
+        self.metrics = kwargs.pop("metrics", None) or Metrics("index")
+
+        self.workers = kwargs.pop("workers", None) or 1
+        self.text_workers = kwargs.pop("text_workers", None) or 1
+        self.compress_threads = kwargs.pop("compress_threads", None)
+        self.block_size = kwargs.pop("block_size", None)
+        self.text_pool = None
+        self.pending_text = deque()
+        self.sort_memory = kwargs.pop("sort_memory", None) or DEFAULT_SORT_MEMORY
+        self.sort_temp_dir = kwargs.pop("sort_temp_dir", None)
+        # already sorted CDXJ files to merge into the index, eg. an existing index
+        self.sorted_runs = kwargs.pop("sorted_runs", None) or []
+        self.pages = PageStore()
+        self.extra_pages = PageStore()
         self.extra_page_lists = {}
         self.title = ""
         self.desc = ""
@@ -39,13 +116,21 @@ class WACZIndexer(CDXJIndexer):
         self.main_page_id = None
         self.hash_type = kwargs.pop("hash_type", "")
 
+        # size and hash of each zip entry, recorded as it is written
+        self.resource_hashes = kwargs.pop("resource_hashes", None)
+        if self.resource_hashes is None:
+            self.resource_hashes = {}
+
+        # (size, hash, crc32) of each input, computed while indexing
+        self.input_digests = {}
+
         self.signing_url = kwargs.pop("signing_url", "")
         self.signing_token = kwargs.pop("signing_token", "")
 
         self._created = None
 
         # If the user has specified a hash type use that otherwise default to sha256
-        if self.hash_type == None:
+        if not self.hash_type:
             self.hash_type = "sha256"
 
         self.passed_pages_dict = kwargs.pop("passed_pages_dict", {})
@@ -70,10 +155,41 @@ class WACZIndexer(CDXJIndexer):
             print(
                 "Warning. You've passed the --text flag without the --detect-pages flag. No pages.jsonl file will be generated. You must enable the --detect-pages and --text flags together in order to get a pages.jsonl file with full text."
             )
-        self.referrers = set()
+        self.referrers = make_referrer_set(
+            kwargs.pop("referrers", None),
+            kwargs.pop("referrers_capacity", None),
+            kwargs.pop("referrers_fp_rate", None),
+        )
+
+        # extracted text by payload digest, shared across runs if a cache dir is set
+        self.text_cache = None
+        if self.extract_text:
+            self.text_cache = TextCache(
+                kwargs.pop("text_cache", None), kwargs.pop("text_cache_size", None)
+            )
+
+    def process_one(self, input_, output, filename):
+        reader = DigestingReader(input_, self.hash_type)
+        num_records = sum(self.record_counts.values())
+
+        with Timer() as timer:
+            super().process_one(reader, output, filename)
+
+        self.input_stats[filename] = {
+            "bytes": reader.size,
+            "records": sum(self.record_counts.values()) - num_records,
+            "wall_time": timer.wall_time,
+            "cpu_time": timer.cpu_time,
+        }
+
+        digest = reader.get_digest()
+        if digest:
+            self.input_digests[filename] = digest
 
     def process_index_entry(self, it, record, *args):
         type_ = record.rec_type
+        self.record_counts[type_] = self.record_counts.get(type_, 0) + 1
+
         if type_ == "warcinfo":
             self.parse_warcinfo(record)
 
@@ -84,9 +200,140 @@ class WACZIndexer(CDXJIndexer):
             super().process_index_entry(it, record, *args)
 
     def process_all(self):
-        super().process_all()
+        with open_or_default(self.output, "wt", sys.stdout) as fh:
+            # spilled sort runs and per-input runs are removed on exit
+            with tempfile.TemporaryDirectory(
+                dir=self.sort_temp_dir, prefix="wacz-"
+            ) as temp_dir:
+                if self.compress:
+                    fh = ParallelCompressedWriter(
+                        fh,
+                        data_out=self.compress,
+                        num_lines=self.num_lines,
+                        data_out_name=self.data_out_name,
+                        digest_records=self.digest_records,
+                        threads=self.compress_threads,
+                        block_size=self.block_size,
+                    )
+
+                if self.sort:
+                    fh = SpillingSortWriter(fh, self.sort_memory, temp_dir)
+                    for run in self.sorted_runs:
+                        fh.add_run(run)
+
+                self.output = fh
+
+                try:
+                    if self.can_process_parallel():
+                        self.process_all_parallel(fh, temp_dir)
+                    else:
+                        Indexer.process_all(self)
+
+                    self.finish_text()
+                finally:
+                    self.close_text_pool()
+                    self.close_text_cache()
+
+                if self.sort or self.compress:
+                    fh.flush()
+
+        self.finish_pages()
+
+    def can_process_parallel(self):
+        """Parallel indexing requires several input paths"""
+        if self.workers <= 1:
+            return False
+
+        self.inputs = list(self.inputs)
+        if len(self.inputs) < 2:
+            return False
+
+        return all(isinstance(input_, str) for input_ in self.inputs)
+
+    def process_all_parallel(self, out, temp_dir):
+        """Index each input in a separate process into a sorted CDXJ run,
+        replay the page events of each run in input order, then merge the runs
+        """
+        runs = [
+            os.path.join(temp_dir, "run-{0}.cdxj".format(i))
+            for i in range(len(self.inputs))
+        ]
+
+        # snapshot, as tasks are pickled while passed pages are being consumed
+        run_kwargs = copy.deepcopy(self.run_kwargs)
+        run_kwargs["sort_memory"] = self.sort_memory // self.workers
+        run_kwargs["sort_temp_dir"] = temp_dir
+        if self.text_cache:
+            # one cache shared by all workers, so text is extracted once
+            run_kwargs["text_cache"] = self.text_cache.cache_dir
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_run_worker,
+            initargs=(sys.stdout is sys.stderr,),
+        ) as executor:
+            futures = [
+                executor.submit(index_run, input_, run, run_kwargs)
+                for input_, run in zip(self.inputs, runs)
+            ]
+
+            # apply results in input order so pages match the serial path
+            for input_, future in zip(self.inputs, futures):
+                self.apply_run(input_, future.result())
+
+        for run in runs:
+            if self.sort:
+                out.add_run(run)
+            else:
+                with open(run, "rt", encoding="utf-8") as run_fh:
+                    for line in run_fh:
+                        out.write(line)
+
+    def apply_run(self, input_, result):
+        for event in result["page_events"]:
+            if event[0] == "warcinfo":
+                self.parse_warcinfo_buff(event[1])
+            else:
+                _, url, ts, is_html, text_data, offset = event
+                id_ = self.check_page(url, ts, is_html)
+                if not id_ or not self.extract_text:
+                    continue
+
+                # text not extracted by the worker, read the record again
+                if offset is not None:
+                    text_data = self.read_record_text(input_, offset, url)
+
+                self.set_page_text(id_, url, text_data)
+
+        self.referrers.update(result["referrers"])
+        self.input_digests.update(result["input_digests"])
+
+        add_counts(self.field_sizes, result["field_sizes"])
+        add_counts(self.record_counts, result["record_counts"])
+        add_span_counts(self.text_stats, result["text_stats"])
+        self.input_stats.update(result["input_stats"])
+
+        if self.text_cache:
+            self.text_cache.hits += result["text_cache_hits"]
+            self.text_cache.misses += result["text_cache_misses"]
 
+    def read_record_text(self, input_, offset, url):
+        """Extract text from the record at offset in input_
+        :returns: (text, title) or None if there is no text
+        :rtype: tuple or None
+        """
+        with open(input_, "rb") as fh:
+            fh.seek(offset)
+            record = next(iter(ArchiveIterator(fh)))
+            return self.get_record_text(record, url)
+
+    def finish_pages(self):
         if self.detect_pages:
+            # stored main page, including any text, before the referrer check
+            main_page = None
+            if self.main_page_entry:
+                main_page = self.pages.get(self.main_page_id, self.main_page_entry)
+
             if self.detect_referrer_check:
                 to_delete = [
                     id_
@@ -99,9 +346,11 @@ class WACZIndexer(CDXJIndexer):
             if self.passed_pages_dict == {}:
                 print("Num Pages Detected: {0}".format(len(self.pages)))
 
-                if self.split_seeds and self.main_page_entry:
+                if self.split_seeds and main_page:
+                    self.extra_pages.close()
                     self.extra_pages = self.pages
-                    self.pages = {self.main_page_id: self.main_page_entry}
+                    self.pages = PageStore()
+                    self.pages[self.main_page_id] = main_page
 
         if (
             hasattr(self, "main_url_flag")
@@ -120,8 +369,57 @@ class WACZIndexer(CDXJIndexer):
         if self.detect_pages:
             self.detect_page(ts, index)
 
+        for name in self.hidden_fields:
+            index.pop(name, None)
+
+        if self.max_field_size:
+            self.limit_field_sizes(index)
+
+        self.count_field_sizes(urlkey, ts, index)
+
         super()._do_write(urlkey, ts, index, out)
 
+    def limit_field_sizes(self, index):
+        """Truncate or hash the values of extra fields over the max field size"""
+        for name in self.extra_fields:
+            value = index.get(name)
+            if not isinstance(value, str):
+                continue
+
+            if len(value.encode("utf-8")) <= self.max_field_size:
+                continue
+
+            if self.oversize_fields == "hash":
+                index[name] = (
+                    "sha256:" + hashlib.sha256(value.encode("utf-8")).hexdigest()
+                )
+            else:
+                index[name] = value.encode("utf-8")[: self.max_field_size].decode(
+                    "utf-8", "ignore"
+                )
+
+    def count_field_sizes(self, urlkey, ts, index):
+        # approximate, each field also takes quotes and separators
+        sizes = self.field_sizes
+        sizes["urlkey"] = sizes.get("urlkey", 0) + len(urlkey) + 1
+        sizes["timestamp"] = sizes.get("timestamp", 0) + len(ts) + 1
+        for name, value in index.items():
+            sizes[name] = sizes.get(name, 0) + len(name) + len(str(value)) + 6
+
+    def print_field_sizes(self):
+        """Print the index bytes taken by each field, largest first"""
+        total = sum(self.field_sizes.values())
+        if not total:
+            return
+
+        print("Index Size by Field:")
+        for name, size in sorted(
+            self.field_sizes.items(), key=lambda item: item[1], reverse=True
+        ):
+            print(
+                "  {0}: {1} bytes ({2:.1f}%)".format(name, size, size * 100.0 / total)
+            )
+
     def detect_page(self, ts, index):
         referrer = index.get("referrer")
         if referrer:
@@ -141,14 +439,16 @@ class WACZIndexer(CDXJIndexer):
         :returns: WARC information or None
         :rtype: dict or None
         """
+        self.parse_warcinfo_buff(self._read_record(record))
+
+    def parse_warcinfo_buff(self, warcinfo_buff):
         warcinfo = {}
-        warcinfo_buff = self._read_record(record)
         warcinfo_buff = warcinfo_buff.decode("utf-8")
         metadata = None
         for line in warcinfo_buff.rstrip().split("\n"):
             parts = line.split(":", 1)
             if parts[0] == "json-metadata":
-                metadata = json.loads(parts[1])
+                metadata = fastjson.loads(parts[1])
             elif len(parts) == 2:
                 warcinfo[parts[0]] = parts[1].strip()
 
@@ -192,9 +492,149 @@ class WACZIndexer(CDXJIndexer):
             self.extra_page_lists[uid] = text_list
 
     def check_pages_and_text(self, record):
+        url, ts, is_html = self.get_page_info(record)
+
+        id_ = self.check_page(url, ts, is_html)
+
+        # if not extracting text, then finish here
+        if not id_ or not self.extract_text:
+            return
+
+        if self.text_workers > 1:
+            self.submit_text(id_, url, record)
+        else:
+            self.set_page_text(id_, url, self.get_record_text(record, url))
+
+    def get_record_text(self, record, url):
+        """Extract text and title from the record, or get them from the text cache
+        :returns: (text, title) or None if there is no text
+        :rtype: tuple or None
+        """
+        digest = self.get_text_cache_digest(record)
+
+        text_data = self.text_cache.get(digest)
+        if text_data:
+            return text_data
+
+        content = self._read_record(record)
+        if not content:
+            return None
+
+        with self.metrics.profile("text extraction"):
+            text_data, stats = extract_text_timed(content, url)
+
+        add_span_counts(self.text_stats, stats)
+        self.text_cache.put(digest, text_data)
+        return text_data
+
+    def get_text_cache_digest(self, record):
+        """Only a record with its own 2xx payload extracts the same text as
+        any other record with the same payload digest, other records, eg. a
+        revisit or an error page, are not looked up in the text cache
+        :returns: the payload digest, or None to not use the text cache
+        :rtype: str or None
+        """
+        if record.rec_type not in ("response", "resource"):
+            return None
+
+        if record.http_headers:
+            status = record.http_headers.get_statuscode()
+            if not status.startswith("2"):
+                return None
+
+        return record.rec_headers.get("WARC-Payload-Digest")
+
+    def submit_text(self, id_, url, record):
+        """Extract text in the text worker pool, blocking on the oldest page
+        when too many pages are pending
+        """
+        digest = self.get_text_cache_digest(record)
+
+        text_data = self.text_cache.get(digest)
+        if text_data:
+            # queued, to be applied in order with pending pages
+            future = Future()
+            future.set_result((text_data, None))
+            self.pending_text.append((id_, url, None, future))
+            return
+
+        content = self._read_record(record)
+        if not content:
+            return
+
+        if not self.text_pool:
+            self.text_pool = ProcessPoolExecutor(
+                max_workers=self.text_workers,
+                initializer=init_run_worker,
+                initargs=(sys.stdout is sys.stderr,),
+            )
+
+        future = self.text_pool.submit(extract_text_timed, content, url)
+        self.pending_text.append((id_, url, digest, future))
+
+        while len(self.pending_text) >= self.text_workers * PENDING_TEXT_PER_WORKER:
+            self.apply_text(*self.pending_text.popleft())
+
+    def apply_text(self, id_, url, digest, future):
+        text_data, stats = future.result()
+        if stats:
+            add_span_counts(self.text_stats, stats)
+
+        if digest:
+            self.text_cache.put(digest, text_data)
+
+        self.set_page_text(id_, url, text_data)
+
+    def finish_text(self):
+        """Wait for pending text extraction, applied in submission order"""
+        while self.pending_text:
+            self.apply_text(*self.pending_text.popleft())
+
+    def close_text_pool(self):
+        for _, _, _, future in self.pending_text:
+            future.cancel()
+
+        self.pending_text.clear()
+
+        if self.text_pool:
+            self.text_pool.shutdown()
+            self.text_pool = None
+
+    def close_text_cache(self):
+        if not self.text_cache:
+            return
+
+        print(
+            "Text Cache: {0} hits, {1} misses".format(
+                self.text_cache.hits, self.text_cache.misses
+            )
+        )
+
+        evicted = self.text_cache.evict()
+        if evicted:
+            print("Text Cache: evicted {0} entries".format(evicted))
+
+        self.text_cache.close()
+
+    def get_page_info(self, record):
         url = record.rec_headers.get("WARC-Target-URI")
         date = record.rec_headers.get("WARC-Date")
         ts = iso_date_to_timestamp(date)
+
+        mime = self.get_record_mime_type(record)
+
+        is_html = mime in HTML_MIME_TYPES and not (
+            record.http_headers and record.http_headers.get_statuscode().startswith("3")
+        )
+
+        return url, ts, is_html
+
+    def check_page(self, url, ts, is_html):
+        """Match the record against passed pages and the main url, detecting
+        a new page if needed
+        :returns: page id if the record is an html page to extract text from
+        :rtype: str or None
+        """
         id_ = ts + "/" + url
         matched_id = ""
         # Check for both a matching url/ts and url entry
@@ -253,50 +693,36 @@ class WACZIndexer(CDXJIndexer):
                 self.main_page_id = id_
                 self.pages[id_] = self.main_page_entry
 
-        mime = self.get_record_mime_type(record)
-
-        if mime not in HTML_MIME_TYPES:
-            return
-
-        if record.http_headers and record.http_headers.get_statuscode().startswith("3"):
-            return
+        if not is_html:
+            return None
 
         if id_ not in self.pages:
             if self.detect_pages:
                 self.pages[id_] = {"timestamp": ts, "url": url, "title": url}
             else:
-                return
+                return None
 
-        # if not extracting text, then finish here
-        if not self.extract_text:
-            return
+        return id_
 
-        content = self._read_record(record)
-        if not content:
+    def set_page_text(self, id_, url, text_data):
+        if not text_data:
             return
 
-        try:
-            extractor = extractors.ArticleExtractor(raise_on_failure=False)
-
-            content = content.decode("utf-8")
-
-            doc = extractor.get_doc(content)
+        text, title = text_data
 
-            curr_page = self.pages[id_]
+        page = self.pages[id_]
 
-            if doc.content:
-                self.pages[id_]["text"] = doc.content
-                self.has_text = True
+        if text:
+            page["text"] = text
+            self.has_text = True
 
-            # only set title if unset, or set to url (default)
-            # avoid overriding user-specified title, if any
-            if doc.title and self.pages[id_].get("title", url) == url:
-                self.pages[id_]["title"] = doc.title
+        # only set title if unset, or set to url (default)
+        # avoid overriding user-specified title, if any
+        if title and page.get("title", url) == url:
+            page["title"] = title
 
-        except Exception as e:
-            # skip text extraction in case of errors
-            print("Skipping, Text Extraction Failed For: " + url)
-            print(e)
+        # pages are stored as copies
+        self.pages[id_] = page
 
     def get_record_mime_type(self, record):
         if record.http_headers:
@@ -313,7 +739,9 @@ class WACZIndexer(CDXJIndexer):
         pages_file = zipfile.ZipInfo(filename, now())
         pages_file.compress_type = zipfile.ZIP_DEFLATED
 
-        with wacz.open(pages_file, "w") as pg_fh:
+        with open_hashed_entry(
+            wacz, pages_file, self.hash_type, self.resource_hashes
+        ) as pg_fh:
             for line in page_iter:
                 pg_fh.write(line.encode("utf-8"))
 
@@ -329,7 +757,7 @@ class WACZIndexer(CDXJIndexer):
         if has_text:
             page_header["hasText"] = True
 
-        yield json.dumps(page_header) + "\n"
+        yield fastjson.output_dumps(page_header) + "\n"
 
         for line in pages:
             if "ts" not in line and "timestamp" in line:
@@ -339,7 +767,7 @@ class WACZIndexer(CDXJIndexer):
 
             line["id"] = line.get("id") or line.get("page_id") or shortuuid.uuid()
 
-            yield json.dumps(line) + "\n"
+            yield fastjson.output_dumps(line) + "\n"
 
     def generate_datapackage(self, res, wacz):
         package_dict = {}
@@ -353,10 +781,14 @@ class WACZIndexer(CDXJIndexer):
             res_entry["name"] = os.path.basename(zip_entry.filename).lower()
             res_entry["path"] = zip_entry.filename
 
-            with wacz.open(zip_entry, "r") as stream:
-                size, hash_ = hash_stream(self.hash_type, stream)
-                res_entry["hash"] = hash_
-                res_entry["bytes"] = size
+            if zip_entry.filename in self.resource_hashes:
+                size, hash_ = self.resource_hashes[zip_entry.filename]
+            else:
+                with wacz.open(zip_entry, "r") as stream:
+                    size, hash_ = hash_stream(self.hash_type, stream)
+
+            res_entry["hash"] = hash_
+            res_entry["bytes"] = size
 
             resources.append(res_entry)
 
@@ -389,7 +821,7 @@ class WACZIndexer(CDXJIndexer):
 
         package_dict["software"] = "py-wacz " + get_py_wacz_version()
 
-        return json.dumps(package_dict, indent=2)
+        return fastjson.output_dumps(package_dict, indent=2)
 
     def generate_datapackage_digest(self, datapackage_bytes):
         digest_dict = {
@@ -400,10 +832,12 @@ class WACZIndexer(CDXJIndexer):
         if self.signing_url:
             self.do_sign(digest_dict)
 
-        return json.dumps(digest_dict, indent=2)
+        return fastjson.output_dumps(digest_dict, indent=2)
 
     def do_sign(self, digest_dict):
         try:
+            import requests
+
             headers = {}
             if self.signing_token:
                 headers["Authorization"] = "bearer " + self.signing_token
@@ -426,3 +860,159 @@ class WACZIndexer(CDXJIndexer):
             print("Added Signature")
         except:
             traceback.print_exc()
+
+
+# ============================================================================
+class WACZRunIndexer(WACZIndexer):
+    """Indexes a single input into a sorted CDXJ run file. Instead of updating
+    pages directly, records the page events to be replayed in input order by
+    the parent WACZIndexer, so that results match serial indexing
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_events = []
+
+    def finish_pages(self):
+        pass
+
+    def close_text_cache(self):
+        # hit counts are reported by the parent, which also evicts
+        if self.text_cache:
+            self.text_cache.close()
+
+    def parse_warcinfo(self, record):
+        warcinfo_buff = self._read_record(record)
+        self.page_events.append(("warcinfo", warcinfo_buff))
+
+        # pages listed here are known to the worker, to extract their text
+        self.parse_warcinfo_buff(warcinfo_buff)
+
+    def process_index_entry(self, it, record, *args):
+        # records are buffered ahead when indexing request and response together
+        self.record_offset = getattr(record, "file_offset", None)
+        if self.record_offset is None:
+            self.record_offset = it.get_record_offset()
+
+        super().process_index_entry(it, record, *args)
+
+    def may_be_page(self, url, ts, matched_id):
+        """Whether the record is known to become a page on replay, a page from
+        the warcinfo of another input is only known on replay
+        """
+        return bool(
+            self.detect_pages
+            or matched_id
+            or url == self.main_url
+            or ts + "/" + url in self.pages
+        )
+
+    def check_pages_and_text(self, record):
+        url, ts, is_html = self.get_page_info(record)
+
+        matched_id = check_http_and_https(url, ts, self.passed_pages_dict)
+
+        # skip records which can't affect pages, passed pages are not consumed here
+        if not is_html and url != self.main_url and not matched_id:
+            return
+
+        # page state is only known after replay, so text is only extracted
+        # here for records which may become pages, the others are read again
+        # from their offset if needed
+        text_data = None
+        offset = None
+        if is_html and self.extract_text:
+            if self.may_be_page(url, ts, matched_id):
+                text_data = self.get_record_text(record, url)
+            else:
+                offset = self.record_offset
+
+        self.page_events.append(("record", url, ts, is_html, text_data, offset))
+
+
+# ============================================================================
+def parse_index_fields(fields):
+    """Parse a comma-separated list of extra index fields
+    :returns: field names as written to the index
+    :rtype: list
+    """
+    names = []
+    for field in (fields or "").split(","):
+        field = field.strip()
+        if not field:
+            continue
+
+        # eg. req.http:referer is written as referrer
+        field = CDXJIndexer.field_names.get(field, field)
+        if field not in names:
+            names.append(field)
+
+    return names
+
+
+def index_run(input_, run_filename, kwargs):
+    """Index one input into a sorted run, used as a process pool task"""
+    indexer = WACZRunIndexer(run_filename, [input_], sort=True, **kwargs)
+    indexer.process_all()
+
+    return {
+        "page_events": indexer.page_events,
+        "referrers": indexer.referrers,
+        "input_digests": indexer.input_digests,
+        "field_sizes": indexer.field_sizes,
+        "input_stats": indexer.input_stats,
+        "record_counts": indexer.record_counts,
+        "text_stats": indexer.text_stats,
+        "text_cache_hits": indexer.text_cache.hits if indexer.text_cache else 0,
+        "text_cache_misses": indexer.text_cache.misses if indexer.text_cache else 0,
+    }
+
+
+def init_run_worker(stdout_to_stderr):
+    """Keep worker messages off stdout when the WACZ is streamed to stdout"""
+    if stdout_to_stderr:
+        sys.stdout = sys.stderr
+
+
+def extract_text(content, url):
+    """Extract text and title from html content
+    :returns: (text, title) or None if extraction failed
+    :rtype: tuple or None
+    """
+    from boilerpy3 import extractors
+
+    try:
+        extractor = extractors.ArticleExtractor(raise_on_failure=False)
+
+        content = content.decode("utf-8")
+
+        doc = extractor.get_doc(content)
+
+        return doc.content, doc.title
+
+    except Exception as e:
+        # skip text extraction in case of errors
+        print("Skipping, Text Extraction Failed For: " + url)
+        print(e)
+        return None
+
+
+def extract_text_timed(content, url):
+    """Extract text and title from html content, timing the extraction
+    :returns: text and title or None, and the stats of the extraction
+    :rtype: tuple
+    """
+    start = time.time()
+    with Timer() as timer:
+        text_data = extract_text(content, url)
+
+    # wall clock start and end, to find the elapsed time across processes
+    stats = {
+        "pages": 1,
+        "bytes": len(content),
+        "worker_time": timer.wall_time,
+        "cpu_time": timer.cpu_time,
+        "start": start,
+        "end": start + timer.wall_time,
+    }
+    return text_data, stats